@@ -0,0 +1,404 @@
+# benchmarks/carga.py
+#
+# Teste de carga com sessões simultâneas contra uma instância local do app.
+#
+# Sobe `streamlit run dashboard.py` em uma porta livre e abre N sessões pelo mesmo
+# websocket que o navegador usa. Cada sessão repete uma sequência realista de
+# interações (países, intervalo de anos, clustering, k, página de análises). A
+# latência de um rerun é o tempo entre o envio dos widgets e o fim do script no
+# servidor. Durante cada nível de concorrência, o CPU e a memória residente do
+# servidor são amostrados a partir do /proc (Linux).
+#
+# Requer o pacote websockets (pip install -r benchmarks/requirements.txt).
+#
+# Uso (a partir da raiz do repositório):
+#   python -m benchmarks.carga --sessoes 1 5 10 20 --saida carga.json
+#   python -m benchmarks.carga --sessoes 10 --orcamento-p95 2.0 --orcamento-p99 5.0
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from websockets.asyncio.client import connect
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SESSOES_PADRAO = [1, 5, 10]
+# Tempo máximo de um rerun e de subida do servidor
+TIMEOUT_RERUN = 300
+TIMEOUT_SERVIDOR = 120
+# Pausa entre interações de uma sessão (segundos), sorteada uniformemente
+PAUSA_INTERACAO = (0.2, 1.0)
+INTERVALO_AMOSTRAGEM = 0.25
+PAGINA_ANALISES = "Análises Detalhadas"
+# Rótulos dos widgets usados pelos cenários (como aparecem no app)
+WIDGET_PAISES = "Selecione o(s) País(es)"
+WIDGET_PAISES_ANALISES = "País(es) para Análise"
+WIDGET_ANOS = "Selecione o Intervalo de Anos"
+WIDGET_CLUSTERING = "Ativar Clustering"
+WIDGET_ESTRATEGIA = "Estratégia de clustering"
+WIDGET_N_GRUPOS = "Número de Grupos"
+
+
+class ServidorLocal:
+    """
+    Instância do app em um subprocesso `streamlit run`, com amostragem de CPU e
+    memória residente (processo principal + filhos) a partir do /proc.
+    """
+
+    def __init__(self, script="dashboard.py", porta=None):
+        self.porta = porta or _porta_livre()
+        self.url = f"ws://127.0.0.1:{self.porta}/_stcore/stream"
+        self.processo = subprocess.Popen(
+            [
+                sys.executable, "-m", "streamlit", "run", script,
+                "--server.headless", "true",
+                "--server.port", str(self.porta),
+                "--server.address", "127.0.0.1",
+                "--server.fileWatcherType", "none",
+                "--browser.gatherUsageStats", "false",
+            ],
+            cwd=RAIZ, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        self._ticks = os.sysconf("SC_CLK_TCK")
+        self._pagina = os.sysconf("SC_PAGE_SIZE")
+
+    def aguardar(self, timeout=TIMEOUT_SERVIDOR):
+        limite = time.monotonic() + timeout
+        while time.monotonic() < limite:
+            if self.processo.poll() is not None:
+                raise RuntimeError(f"O servidor terminou com código {self.processo.returncode}")
+            try:
+                with socket.create_connection(("127.0.0.1", self.porta), timeout=1):
+                    return
+            except OSError:
+                time.sleep(0.2)
+        raise TimeoutError("O servidor não respondeu a tempo")
+
+    def encerrar(self):
+        self.processo.terminate()
+        try:
+            self.processo.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.processo.kill()
+
+    def _processos(self):
+        """
+        PIDs do servidor e de todos os seus descendentes (ex.: pool da varredura de k).
+        """
+        filhos = {}
+        for nome in os.listdir("/proc"):
+            if nome.isdigit():
+                try:
+                    with open(f"/proc/{nome}/stat") as f:
+                        ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+                except (OSError, IndexError, ValueError):
+                    continue
+                filhos.setdefault(ppid, []).append(int(nome))
+        pids, pendentes = [], [self.processo.pid]
+        while pendentes:
+            pid = pendentes.pop()
+            pids.append(pid)
+            pendentes.extend(filhos.get(pid, []))
+        return pids
+
+    def amostra(self):
+        """
+        (segundos de CPU acumulados, memória residente em MB) do servidor e filhos.
+        """
+        cpu, rss = 0.0, 0
+        for pid in self._processos():
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    campos = f.read().rsplit(")", 1)[1].split()
+                with open(f"/proc/{pid}/statm") as f:
+                    paginas = int(f.read().split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            cpu += (int(campos[11]) + int(campos[12])) / self._ticks
+            rss += paginas * self._pagina
+        return cpu, rss / 2**20
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _valor_widget(tipo, proto, valor):
+    """
+    WidgetState com o valor serializado como o frontend envia para cada tipo de widget.
+    """
+    estado = WidgetState(id=proto.id)
+    if tipo == "checkbox":
+        estado.bool_value = bool(valor)
+    elif tipo == "multiselect":
+        estado.string_array_value.data.extend(valor)
+    elif tipo == "selectbox":
+        estado.string_value = valor
+    elif tipo == "slider" and proto.options:
+        estado.string_array_value.data.extend(valor)
+    elif tipo == "slider":
+        estado.double_array_value.data.extend(float(v) for v in valor)
+    elif tipo == "number_input":
+        estado.double_value = float(valor)
+    else:
+        raise ValueError(f"Tipo de widget não suportado: {tipo}")
+    return estado
+
+
+class SessaoSimulada:
+    """
+    Uma sessão de navegador: mantém os widgets renderizados e os valores enviados
+    por página e mede cada rerun até o script_finished do servidor.
+    """
+
+    def __init__(self, ws, seed):
+        self.ws = ws
+        self.rng = random.Random(seed)
+        self.paginas = {}
+        self.principal = ""
+        self.pagina = ""
+        self.widgets = {}
+        self.estados = {}
+        self.latencias = []
+        self.erros = 0
+
+    async def rerun(self):
+        cliente = BackMsg()
+        cliente.rerun_script.query_string = ""
+        cliente.rerun_script.page_script_hash = self.pagina
+        cliente.rerun_script.widget_states.widgets.extend(self.estados.get(self.pagina, {}).values())
+
+        widgets = {}
+        inicio = time.perf_counter()
+        await self.ws.send(cliente.SerializeToString())
+        while True:
+            msg = ForwardMsg()
+            msg.ParseFromString(await asyncio.wait_for(self.ws.recv(), TIMEOUT_RERUN))
+            tipo_msg = msg.WhichOneof("type")
+            if tipo_msg == "new_session":
+                self.paginas = {p.page_name: p.page_script_hash for p in msg.new_session.app_pages}
+                self.principal = msg.new_session.main_script_hash
+                self.pagina = msg.new_session.page_script_hash
+            elif tipo_msg == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                elemento = msg.delta.new_element
+                tipo = elemento.WhichOneof("type")
+                if tipo == "exception":
+                    self.erros += 1
+                proto = getattr(elemento, tipo) if tipo else None
+                if proto is not None and hasattr(proto, "id") and hasattr(proto, "label") and proto.id:
+                    widgets[proto.label] = (tipo, proto)
+            elif tipo_msg == "script_finished":
+                break
+        self.latencias.append(time.perf_counter() - inicio)
+        self.widgets = widgets
+
+    async def definir(self, rotulo, valor):
+        """
+        Altera um widget (pelo rótulo) e dispara o rerun, como uma interação do usuário.
+        """
+        tipo, proto = self.widgets[rotulo]
+        self.estados.setdefault(self.pagina, {})[proto.id] = _valor_widget(tipo, proto, valor)
+        await self.rerun()
+
+    async def navegar(self, nome_pagina=None):
+        """
+        Abre uma página da barra de navegação (None: a página principal).
+        """
+        self.pagina = self.paginas[nome_pagina] if nome_pagina else self.principal
+        await self.rerun()
+
+    async def pausa(self):
+        await asyncio.sleep(self.rng.uniform(*PAUSA_INTERACAO))
+
+
+async def cenario_visao_geral(sessao):
+    """
+    Filtros da visão geral, clustering ligado com alguns k e estratégias, e volta ao padrão.
+    """
+    rng = sessao.rng
+    _, paises = sessao.widgets[WIDGET_PAISES]
+    await sessao.definir(WIDGET_PAISES, rng.sample(list(paises.options), rng.randint(1, 5)))
+    await sessao.pausa()
+
+    _, anos = sessao.widgets[WIDGET_ANOS]
+    inicio = rng.randint(int(anos.min), int(anos.max))
+    await sessao.definir(WIDGET_ANOS, [inicio, rng.randint(inicio, int(anos.max))])
+    await sessao.pausa()
+
+    await sessao.definir(WIDGET_CLUSTERING, True)
+    await sessao.pausa()
+    for _ in range(2):
+        await sessao.definir(WIDGET_N_GRUPOS, [rng.randint(2, 10)])
+        await sessao.pausa()
+    _, estrategias = sessao.widgets[WIDGET_ESTRATEGIA]
+    await sessao.definir(WIDGET_ESTRATEGIA, rng.choice(list(estrategias.options)))
+    await sessao.pausa()
+
+    await sessao.definir(WIDGET_CLUSTERING, False)
+    await sessao.pausa()
+    await sessao.definir(WIDGET_PAISES, [])
+    await sessao.pausa()
+
+
+async def cenario_analises(sessao):
+    """
+    Página de Análises Detalhadas: troca da seleção de países e volta a todos.
+    """
+    rng = sessao.rng
+    await sessao.navegar(PAGINA_ANALISES)
+    await sessao.pausa()
+    _, paises = sessao.widgets[WIDGET_PAISES_ANALISES]
+    for _ in range(2):
+        await sessao.definir(WIDGET_PAISES_ANALISES, rng.sample(list(paises.options), rng.randint(1, 10)))
+        await sessao.pausa()
+    await sessao.definir(WIDGET_PAISES_ANALISES, list(paises.options))
+    await sessao.pausa()
+    await sessao.navegar()
+
+
+CENARIOS = [cenario_visao_geral, cenario_analises]
+
+
+async def executar_sessao(url, seed, iteracoes):
+    async with connect(url, subprotocols=["streamlit"], max_size=None) as ws:
+        sessao = SessaoSimulada(ws, seed)
+        await sessao.rerun()
+        for _ in range(iteracoes):
+            for cenario in CENARIOS:
+                await cenario(sessao)
+        return sessao
+
+
+async def _amostrar(servidor, amostras, parar):
+    while not parar.is_set():
+        amostras.append((time.perf_counter(), *servidor.amostra()))
+        try:
+            await asyncio.wait_for(parar.wait(), INTERVALO_AMOSTRAGEM)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def executar_nivel(servidor, n_sessoes, iteracoes, seed):
+    """
+    Executa n_sessoes simultâneas e resume latências de rerun, CPU e memória do servidor.
+    """
+    amostras, parar = [], asyncio.Event()
+    amostrador = asyncio.create_task(_amostrar(servidor, amostras, parar))
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(
+        *(executar_sessao(servidor.url, seed + i, iteracoes) for i in range(n_sessoes)),
+        return_exceptions=True,
+    )
+    segundos = time.perf_counter() - inicio
+    parar.set()
+    await amostrador
+    amostras.append((time.perf_counter(), *servidor.amostra()))
+
+    sessoes = [r for r in resultados if isinstance(r, SessaoSimulada)]
+    falhas = [repr(r) for r in resultados if not isinstance(r, SessaoSimulada)]
+    latencias = np.array([x for s in sessoes for x in s.latencias])
+    cpu_segundos = amostras[-1][1] - amostras[0][1]
+    p50, p95, p99 = np.percentile(latencias, [50, 95, 99]) if len(latencias) else (np.nan,) * 3
+    return {
+        "sessoes": n_sessoes,
+        "reruns": len(latencias),
+        "segundos": round(segundos, 3),
+        "p50": round(float(p50), 4),
+        "p95": round(float(p95), 4),
+        "p99": round(float(p99), 4),
+        "max": round(float(latencias.max()), 4) if len(latencias) else None,
+        "erros_script": sum(s.erros for s in sessoes),
+        "sessoes_com_falha": falhas,
+        "cpu_pct_medio": round(100 * cpu_segundos / segundos, 1),
+        "rss_mb_inicio": round(amostras[0][2], 1),
+        "rss_mb_pico": round(max(a[2] for a in amostras), 1),
+    }
+
+
+def verificar_orcamento(niveis, orcamento_p95=None, orcamento_p99=None):
+    """
+    Lista das violações de orçamento de latência (e de sessões que falharam).
+    """
+    violacoes = []
+    for nivel in niveis:
+        for percentil, orcamento in (("p95", orcamento_p95), ("p99", orcamento_p99)):
+            if orcamento is not None and not nivel[percentil] <= orcamento:
+                violacoes.append({"sessoes": nivel["sessoes"], "metrica": percentil,
+                                  "valor": nivel[percentil], "orcamento": orcamento})
+        if nivel["sessoes_com_falha"] or nivel["erros_script"]:
+            violacoes.append({"sessoes": nivel["sessoes"], "metrica": "falhas",
+                              "valor": len(nivel["sessoes_com_falha"]) + nivel["erros_script"], "orcamento": 0})
+    return violacoes
+
+
+async def _executar(args):
+    servidor = ServidorLocal(porta=args.porta)
+    try:
+        servidor.aguardar()
+        # Aquecimento: carga dos dados e caches compartilhados não entram nas medições
+        await executar_sessao(servidor.url, args.seed, 1)
+        niveis = []
+        for n in args.sessoes:
+            print(f"Executando com {n} sessão(ões) simultânea(s)...", file=sys.stderr)
+            niveis.append(await executar_nivel(servidor, n, args.iteracoes, args.seed))
+        return niveis
+    finally:
+        servidor.encerrar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do dashboard com sessões simultâneas.")
+    parser.add_argument("--sessoes", type=int, nargs="+", default=SESSOES_PADRAO,
+                        help="Níveis de concorrência (sessões simultâneas)")
+    parser.add_argument("--iteracoes", type=int, default=1, help="Repetições dos cenários por sessão")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--porta", type=int, help="Porta do servidor (padrão: uma porta livre)")
+    parser.add_argument("--saida", help="Arquivo JSON de saída (padrão: stdout)")
+    parser.add_argument("--orcamento-p95", type=float, help="Latência p95 máxima de um rerun (segundos)")
+    parser.add_argument("--orcamento-p99", type=float, help="Latência p99 máxima de um rerun (segundos)")
+    args = parser.parse_args()
+
+    niveis = asyncio.run(_executar(args))
+    violacoes = verificar_orcamento(niveis, args.orcamento_p95, args.orcamento_p99)
+    relatorio = {
+        "gerado_em": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "iteracoes": args.iteracoes,
+        "niveis": niveis,
+        "violacoes": violacoes,
+    }
+
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+    for v in violacoes:
+        print(
+            f"ORÇAMENTO EXCEDIDO ({v['sessoes']} sessões): {v['metrica']} = {v['valor']} "
+            f"(limite {v['orcamento']})", file=sys.stderr
+        )
+    sys.exit(1 if violacoes else 0)
+
+
+if __name__ == "__main__":
+    main()
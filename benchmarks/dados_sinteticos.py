@@ -0,0 +1,113 @@
+# benchmarks/dados_sinteticos.py
+
+import numpy as np
+import pandas as pd
+
+from data_loader import INCIDENT_TYPE_COLS
+
+# Probabilidade de o contador ser positivo e média dos valores positivos
+# (aproximadas a partir do dataset 2020-2025)
+CONTADORES = {
+    'Educators Killed': (0.10, 1.2),
+    'Educators Injured': (0.08, 2.0),
+    'Educators Kidnapped': (0.03, 2.5),
+    'Educators Arrested': (0.05, 4.0),
+    'Students Attacked in School': (0.20, 11.0),
+    'Students Killed': (0.06, 2.0),
+    'Students Injured': (0.08, 5.0),
+    'Students Kidnapped': (0.02, 22.0),
+    'Students Arrested': (0.04, 8.0),
+    'Sexual Violence Affecting School Age Children': (0.003, 2.4),
+}
+# Frequência de cada indicador de tipo de incidente
+FREQUENCIA_TIPOS = {
+    'Attacks on Schools': 0.62,
+    'Attacks on Universities': 0.08,
+    'Military Occupation of Education facility': 0.08,
+    'Arson attack on education facility': 0.07,
+    'Forced Entry into education facility': 0.12,
+    'Damage/Destruction To Ed facility Event': 0.48,
+    'Attacks on Students and Teachers': 0.23,
+}
+# Ordem das colunas da planilha original
+COLUNAS = [
+    'Date', 'Event Description', 'Country', 'Country ISO', 'Admin 1', 'Latitude', 'Longitude',
+    'Geo Precision', 'Location of event', 'Reported Perpetrator', 'Reported Perpetrator Name',
+    'Weapon Carried/Used', 'Type of education facility',
+] + INCIDENT_TYPE_COLS + [
+    'Educators Killed', 'Educators Injured', 'Educators Kidnapped', 'Educators Arrested',
+    'Known Educators Kidnap Or Arrest Outcome', 'Students Attacked in School', 'Students Killed',
+    'Students Injured', 'Students Kidnapped', 'Known Student Kidnap Or Arrest Outcome',
+    'Students Arrested', 'Sexual Violence Affecting School Age Children', 'SiND Event ID'
+]
+GEO_PRECISION = [
+    '(2) 25 km Precision ', '(3) District, Communicipality or Commune ',
+    '(4) Province, State, Governorate ', '(6) Country', 'censored', 'censored by HDX', None
+]
+
+
+def _vocabulario(prefixo, n):
+    return np.array([f"{prefixo} {i:03d}" for i in range(n)], dtype=object)
+
+
+def _zipf(rng, n_categorias, tamanho, a=1.3):
+    """
+    Sorteia índices de categorias com frequências de cauda longa (como países e armas).
+    """
+    pesos = 1.0 / np.arange(1, n_categorias + 1) ** a
+    return rng.choice(n_categorias, size=tamanho, p=pesos / pesos.sum())
+
+
+def gerar_incidentes(n_linhas, seed=0):
+    """
+    Gera um DataFrame bruto com o mesmo layout da planilha do Kaggle (33 colunas,
+    antes do limpar_dados), com cardinalidades e distribuições próximas às reais.
+    """
+    rng = np.random.default_rng(seed)
+
+    n_paises = 93
+    paises = _vocabulario("País", n_paises)
+    isos = np.array([f"P{i:02d}" for i in range(n_paises)], dtype=object)
+    idx_pais = _zipf(rng, n_paises, n_linhas)
+    centro_lat = rng.uniform(-40, 60, n_paises)
+    centro_lon = rng.uniform(-120, 140, n_paises)
+
+    latitude = np.round(centro_lat[idx_pais] + rng.normal(0, 3, n_linhas), 1)
+    longitude = np.round(centro_lon[idx_pais] + rng.normal(0, 3, n_linhas), 1)
+    sem_coordenadas = rng.random(n_linhas) < 0.136
+    latitude[sem_coordenadas] = np.nan
+    longitude[sem_coordenadas] = np.nan
+
+    inicio = np.datetime64('2020-01-01')
+    dias = rng.integers(0, 365 * 5 + 145, n_linhas)
+
+    df = pd.DataFrame({
+        'Date': pd.to_datetime(inicio + dias.astype('timedelta64[D]')),
+        'Event Description': np.nan,
+        'Country': paises[idx_pais],
+        'Country ISO': isos[idx_pais],
+        'Admin 1': _vocabulario("Região", 570)[_zipf(rng, 570, n_linhas, a=1.0)],
+        'Latitude': latitude,
+        'Longitude': longitude,
+        'Geo Precision': np.array(GEO_PRECISION, dtype=object)[rng.integers(0, len(GEO_PRECISION), n_linhas)],
+        'Location of event': _vocabulario("Local", 8)[_zipf(rng, 8, n_linhas)],
+        'Reported Perpetrator': _vocabulario("Perpetrador", 15)[_zipf(rng, 15, n_linhas)],
+        'Reported Perpetrator Name': _vocabulario("Grupo", 288)[_zipf(rng, 288, n_linhas)],
+        'Weapon Carried/Used': _vocabulario("Arma", 54)[_zipf(rng, 54, n_linhas)],
+        'Type of education facility': _vocabulario("Instalação", 14)[_zipf(rng, 14, n_linhas)],
+    })
+    df.loc[rng.random(n_linhas) < 0.05, 'Admin 1'] = None
+
+    for col in INCIDENT_TYPE_COLS:
+        indicador = rng.random(n_linhas) < FREQUENCIA_TIPOS[col]
+        df[col] = indicador if col == 'Attacks on Students and Teachers' else indicador.astype('int64')
+
+    for col, (prob, media) in CONTADORES.items():
+        positivo = rng.random(n_linhas) < prob
+        valores = np.minimum(rng.geometric(1.0 / media, n_linhas), 400)
+        df[col] = np.where(positivo, valores, 0).astype('int64')
+
+    df['Known Educators Kidnap Or Arrest Outcome'] = 'NoInformation'
+    df['Known Student Kidnap Or Arrest Outcome'] = 'NoInformation'
+    df['SiND Event ID'] = np.arange(1, n_linhas + 1, dtype='int64')
+    return df[COLUNAS]
@@ -0,0 +1,211 @@
+# benchmarks/executar.py
+#
+# Benchmark de escala do dashboard com dados sintéticos.
+#
+# Uso (a partir da raiz do repositório):
+#   python -m benchmarks.executar --tamanhos 5000 50000 1000000 --saida resultados.json
+#   python -m benchmarks.executar --baseline benchmarks/baseline.json --tolerancia 1.25
+#   python -m benchmarks.executar --salvar-baseline benchmarks/baseline.json
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from benchmarks.dados_sinteticos import gerar_incidentes
+from data_loader import (
+    limpar_dados, IndiceFiltros, construir_cubo, SerieTemporal, detectar_anomalias, ConsultaCubo, BackendDuckDB, aplicar_clustering,
+    avaliar_clustering_detalhado, avaliar_perfil_misto, FEATURES_IMPACTO, HOTSPOT_TAMANHO_KM, HOTSPOTS_POR_PAIS, duckdb
+)
+from graficos_analises import SECOES, secao_america_do_sul
+
+TAMANHOS_PADRAO = [5000, 50000, 500000]
+# Acima deste tamanho o Silhouette exato (O(n²)) não é medido
+LIMITE_SILHOUETTE_EXATO = 20000
+# Etapas mais rápidas que isto não são comparadas com o baseline (ruído de medição)
+TEMPO_MINIMO_COMPARACAO = 0.005
+PAISES_SUL_AMERICANOS_SINTETICOS = [f"País {i:03d}" for i in range(10, 22)]
+
+
+def medir(etapa, func, *args, **kwargs):
+    """
+    Executa func medindo tempo de parede e pico de memória alocada (tracemalloc).
+    """
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = func(*args, **kwargs)
+    segundos = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, {"etapa": etapa, "segundos": round(segundos, 6), "pico_mb": round(pico / 2**20, 3)}
+
+
+def _medir_secoes(prefixo, consulta):
+    """
+    Mede cada seção da página de Análises Detalhadas sobre uma consulta do backend.
+    """
+    medicoes = []
+    for secao, func in SECOES.items():
+        if func is secao_america_do_sul:
+            _, m = medir(f"{prefixo}.{secao}", func, consulta, PAISES_SUL_AMERICANOS_SINTETICOS)
+        else:
+            _, m = medir(f"{prefixo}.{secao}", func, consulta)
+        medicoes.append(m)
+    return medicoes
+
+
+def executar_tamanho(n_linhas, n_clusters=4, seed=0):
+    """
+    Mede todas as etapas para um tamanho de dataset sintético.
+    """
+    bruto = gerar_incidentes(n_linhas, seed=seed)
+    medicoes = []
+
+    df, m = medir("load_data.limpeza", limpar_dados, bruto)
+    medicoes.append(m)
+    del bruto
+
+    indice, m = medir("filtros.indice", IndiceFiltros, df)
+    medicoes.append(m)
+    paises = list(df['Country'].cat.categories[:5])
+    anos = (int(df['Year'].min()) + 1, int(df['Year'].max()) - 1)
+    df_filtrado, m = medir("filtros.selecao", lambda: df.take(indice.posicoes(paises, anos)))
+    medicoes.append(m)
+    _, m = medir("filtros.todos_paises", lambda: df.take(indice.posicoes(None, anos)))
+    medicoes.append(m)
+
+    df_cluster, m = medir("clustering.aplicar", aplicar_clustering, df, n_clusters=n_clusters, usar_cache=False)
+    medicoes.append(m)
+    _, m = medir(
+        "clustering.avaliar_amostrado", avaliar_clustering_detalhado,
+        df_cluster, df_cluster['Cluster'], FEATURES_IMPACTO, padronizar=True
+    )
+    medicoes.append(m)
+    if n_linhas <= LIMITE_SILHOUETTE_EXATO:
+        _, m = medir(
+            "clustering.avaliar_exato", avaliar_clustering_detalhado,
+            df_cluster, df_cluster['Cluster'], FEATURES_IMPACTO, amostra=None, padronizar=True
+        )
+        medicoes.append(m)
+    del df_cluster
+
+    df_cluster, m = medir(
+        "clustering.perfil_misto.aplicar", aplicar_clustering, df,
+        n_clusters=n_clusters, usar_cache=False, estrategia="perfil_misto"
+    )
+    medicoes.append(m)
+    _, m = medir("clustering.perfil_misto.avaliar_amostrado", avaliar_perfil_misto, df_cluster, df_cluster['Cluster'])
+    medicoes.append(m)
+    del df_cluster
+
+    cubo, m = medir("analises.cubo", construir_cubo, df)
+    medicoes.append(m)
+    serie, m = medir("serie_temporal.construir", SerieTemporal, cubo)
+    medicoes.append(m)
+    _, m = medir("serie_temporal.total", serie.total, 'Incidentes', paises, anos)
+    medicoes.append(m)
+    _, m = medir("serie_temporal.mensal", serie.serie_mensal, ('Incidentes', 'Total Victims'), paises, anos)
+    medicoes.append(m)
+    _, m = medir("anomalias.detectar", detectar_anomalias, serie)
+    medicoes.append(m)
+
+    indice_cubo = IndiceFiltros(cubo)
+    medicoes.extend(_medir_secoes("analises", ConsultaCubo(cubo.take(indice_cubo.posicoes(None)))))
+
+    if duckdb is not None:
+        # Mesmas seções com filtros e agregações resolvidos pelo DuckDB sobre Parquet
+        with tempfile.TemporaryDirectory() as diretorio:
+            arquivo = os.path.join(diretorio, "incidentes.parquet")
+            df.to_parquet(arquivo, index=False)
+            backend, m = medir("duckdb.abrir", BackendDuckDB, [arquivo])
+            medicoes.append(m)
+            _, m = medir("duckdb.filtros.selecao", backend.linhas, paises, anos)
+            medicoes.append(m)
+            _, m = medir("duckdb.mapa.agregar", backend.pontos_mapa, 2, paises, anos)
+            medicoes.append(m)
+            _, m = medir("duckdb.hotspots", backend.hotspots, HOTSPOT_TAMANHO_KM, HOTSPOTS_POR_PAIS, paises, anos)
+            medicoes.append(m)
+            medicoes.extend(_medir_secoes("analises_duckdb", backend.consulta()))
+
+    for m in medicoes:
+        m.update({"linhas": n_linhas, "linhas_filtradas": len(df_filtrado), "celulas_cubo": len(cubo)})
+    return medicoes
+
+
+def comparar(resultados, baseline, tolerancia):
+    """
+    Compara com um baseline salvo. Devolve a lista de regressões (tempo ou pico de
+    memória acima de baseline × tolerância).
+    """
+    referencia = {(m["linhas"], m["etapa"]): m for m in baseline["resultados"]}
+    regressoes = []
+    for m in resultados:
+        base = referencia.get((m["linhas"], m["etapa"]))
+        if base is None:
+            continue
+        if base["segundos"] >= TEMPO_MINIMO_COMPARACAO and m["segundos"] > base["segundos"] * tolerancia:
+            regressoes.append({**m, "metrica": "segundos", "baseline": base["segundos"]})
+        if base["pico_mb"] > 1 and m["pico_mb"] > base["pico_mb"] * tolerancia:
+            regressoes.append({**m, "metrica": "pico_mb", "baseline": base["pico_mb"]})
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de escala do dashboard com dados sintéticos.")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=TAMANHOS_PADRAO)
+    parser.add_argument("--clusters", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--saida", help="Arquivo JSON de saída (padrão: stdout)")
+    parser.add_argument("--baseline", help="JSON de um baseline salvo para comparação")
+    parser.add_argument("--tolerancia", type=float, default=1.25,
+                        help="Razão máxima aceita em relação ao baseline (padrão: 1.25)")
+    parser.add_argument("--salvar-baseline", help="Salva os resultados como novo baseline")
+    args = parser.parse_args()
+
+    # Aquecimento: imports tardios e caches do Plotly não entram nas medições
+    executar_tamanho(1000, n_clusters=args.clusters, seed=args.seed)
+
+    resultados = []
+    for n in args.tamanhos:
+        print(f"Executando com {n:,} linhas...", file=sys.stderr)
+        resultados.extend(executar_tamanho(n, n_clusters=args.clusters, seed=args.seed))
+
+    relatorio = {
+        "gerado_em": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "tamanhos": args.tamanhos,
+        "resultados": resultados,
+    }
+
+    regressoes = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressoes = comparar(resultados, json.load(f), args.tolerancia)
+        relatorio["regressoes"] = regressoes
+
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        print(texto)
+    if args.salvar_baseline:
+        with open(args.salvar_baseline, 'w', encoding='utf-8') as f:
+            f.write(texto)
+
+    for r in regressoes:
+        print(
+            f"REGRESSÃO {r['etapa']} ({r['linhas']:,} linhas): {r['metrica']} = "
+            f"{r[r['metrica']]} (baseline {r['baseline']})", file=sys.stderr
+        )
+    sys.exit(1 if regressoes else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,26 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import numpy as np
-from data_loader import load_data, aplicar_clustering, avaliar_clustering
+from instrumentacao import etapa, iniciar_rerun, finalizar_rerun
+from data_loader import (
+    obter_backend, carregar_serie_temporal, media_movel, comparativo_anual, aplicar_clustering,
+    avaliar_clustering_detalhado, avaliar_perfil_misto, perfil_categorico_clusters, obter_cache_clustering,
+    FEATURES_IMPACTO, FEATURES_CATEGORICAS_PERFIL, ESTRATEGIAS_CLUSTERING, SILHOUETTE_SAMPLE_SIZE,
+    impressao_digital, varrer_k_cacheado, sugerir_k,
+    agregar_pontos_mapa, tamanho_celula_mapa, MAP_RAW_POINTS_THRESHOLD, MAP_SUM_COLS,
+    HOTSPOT_TAMANHO_KM, HOTSPOTS_POR_PAIS,
+    carregar_anomalias, posicionar_picos, ANOMALIA_LIMIAR_Z, ANOMALIA_JANELA,
+    metadados_dataset, DEFAULT_COUNTRIES, DEFAULT_N_CLUSTERS
+)
 
 st.set_page_config(layout="wide", page_title="Visão Geral | Educação em Perigo")
+iniciar_rerun("visao_geral")
 
 # --- Carregamento dos dados ---
+# Backend de consultas: pandas (dataset em memória) ou duckdb (SQL sobre Parquet), ver EDU_DANGER_BACKEND
 try:
-    df = load_data()
+    backend = obter_backend()
+    metadados = metadados_dataset()
 except Exception as e:
     st.error("Ocorreu um erro ao carregar e processar os dados.")
     st.error(f"Detalhe técnico do erro: {e}")
@@ -20,165 +33,433 @@ st.markdown("Use o menu à esquerda para navegar entre a **Visão Geral** e as *
 
 # --- Filtros principais ---
 st.sidebar.header("Filtros para Visão Geral")
-paises_sorted = sorted(df['Country'].unique())
-paises_default_desejados = ["Nigeria"] 
+paises_sorted = metadados["paises"]
+paises_default_desejados = DEFAULT_COUNTRIES
 paises_default_validos = [p for p in paises_default_desejados if p in paises_sorted]
 selected_countries = st.sidebar.multiselect(
     "Selecione o(s) País(es)", options=paises_sorted, default=paises_default_validos
 )
 
-min_year, max_year = int(df['Year'].min()), int(df['Year'].max())
+min_year, max_year = metadados["ano_min"], metadados["ano_max"]
 selected_year_range = st.sidebar.slider(
     "Selecione o Intervalo de Anos", min_value=min_year, max_value=max_year, value=(min_year, max_year)
 )
 
-# --- Filtro de dados ---
-query_parts = []
-if selected_countries:
-    query_parts.append(f"Country in @selected_countries")
-else: 
-    query_parts.append("Country == Country")
+# --- Mapa ---
+st.sidebar.header("Mapa")
+modo_mapa = st.sidebar.selectbox("Modo do mapa", ["Automático", "Agregado", "Pontos individuais"])
+limite_pontos_mapa = st.sidebar.number_input(
+    "Máximo de pontos individuais (modo automático)", min_value=0,
+    value=MAP_RAW_POINTS_THRESHOLD, step=500
+)
+
+# --- Hotspots ---
+st.sidebar.header("Hotspots")
+tamanho_hotspot = st.sidebar.slider("Tamanho do hotspot (km)", 5, 100, HOTSPOT_TAMANHO_KM, step=5)
+hotspots_por_pais = st.sidebar.slider("Hotspots por país", 1, 10, HOTSPOTS_POR_PAIS)
 
-query_parts.append(f"Year >= {selected_year_range[0]} and Year <= {selected_year_range[1]}")
-full_query = " and ".join(query_parts)
-df_filtered = df.query(full_query)
+st.sidebar.header("Alertas de Picos")
+limiar_alerta = st.sidebar.slider("Limiar do z robusto", 2.0, 8.0, ANOMALIA_LIMIAR_Z, step=0.5)
+destacar_picos_mapa = st.sidebar.checkbox("Destacar picos no mapa", value=True)
 
-# --- Clustering (impacto_vitimas) ---
+# --- Clustering (impacto_vitimas ou perfil_misto) ---
 st.sidebar.header("Clustering (Agrupamento)")
 usar_clustering = st.sidebar.checkbox("Ativar Clustering")
-num_clusters = st.sidebar.slider("Número de Grupos", 2, 50, 4)
+estrategia = st.sidebar.selectbox(
+    "Estratégia de clustering", list(ESTRATEGIAS_CLUSTERING), format_func=ESTRATEGIAS_CLUSTERING.get
+)
+num_clusters = st.sidebar.slider("Número de Grupos", 2, 50, DEFAULT_N_CLUSTERS)
+amostra_silhouette = st.sidebar.number_input(
+    "Amostra do Silhouette (0 = todos)", min_value=0, value=SILHOUETTE_SAMPLE_SIZE, step=500
+)
+avaliar_no_espaco_do_modelo = st.sidebar.checkbox(
+    "Avaliar no espaço padronizado do modelo (Pct_*)", value=True
+)
+usar_varredura_k = st.sidebar.checkbox("Sugerir número de grupos (varredura de k)")
+if usar_varredura_k:
+    intervalo_k = st.sidebar.slider("Intervalo de k para a varredura", 2, 50, (2, 15))
+
+# --- Filtro de dados ---
+# Sem países selecionados, todos os países são considerados. Só as colunas usadas
+# pela página são lidas (no duckdb, o SELECT não traz as demais colunas do Parquet)
+colunas_pagina = list(dict.fromkeys(
+    ["Country", "Year", "Month", "Latitude", "Longitude", "Admin 1", "Reported Perpetrator Name",
+     "Weapon Carried/Used"] + MAP_SUM_COLS + (FEATURES_CATEGORICAS_PERFIL if usar_clustering else [])
+))
+df_filtered = backend.linhas(
+    paises=selected_countries or None, intervalo_anos=selected_year_range, colunas=colunas_pagina
+)
 
 if usar_clustering:
     try:
-        estrategia = "impacto_vitimas"
-        df_filtered = aplicar_clustering(df_filtered, n_clusters=num_clusters)
+        df_filtered = aplicar_clustering(df_filtered, n_clusters=num_clusters, estrategia=estrategia)
         df_filtered['Cluster'] = df_filtered['Cluster'].astype(str)
 
-        features_usadas = [
-            "Total Killed", "Total Injured", "Total Kidnapped",
-            "Total Arrested", "Sexual Violence Affecting School Age Children"
-        ]
-        df_encoded = df_filtered[features_usadas]
-
-        score = avaliar_clustering(df_encoded, df_filtered['Cluster'], df_encoded.columns)
-        st.sidebar.info(f"Silhouette Score: **{score}**")
+        if estrategia == "perfil_misto":
+            # Silhouette na métrica do KPrototypes (Pct_* padronizadas + atributos categóricos)
+            features_usadas = None
+        elif avaliar_no_espaco_do_modelo:
+            # Mesmo espaço padronizado das features Pct_* usadas pelo KMeans
+            features_usadas = FEATURES_IMPACTO
+        else:
+            features_usadas = [
+                "Total Killed", "Total Injured", "Total Kidnapped",
+                "Total Arrested", "Sexual Violence Affecting School Age Children"
+            ]
+
+        try:
+            if features_usadas is None:
+                avaliacao = avaliar_perfil_misto(
+                    df_filtered, df_filtered['Cluster'], amostra=amostra_silhouette or None
+                )
+            else:
+                avaliacao = avaliar_clustering_detalhado(
+                    df_filtered, df_filtered['Cluster'], features_usadas,
+                    amostra=amostra_silhouette or None, padronizar=avaliar_no_espaco_do_modelo
+                )
+            if avaliacao['ic_inferior'] is None:
+                intervalo = ""
+            else:
+                intervalo = f"IC 95%: {avaliacao['ic_inferior']:.3f} a {avaliacao['ic_superior']:.3f}; "
+            st.sidebar.info(
+                f"Silhouette Score: **{avaliacao['score']:.3f}** ({intervalo}n = {avaliacao['n_amostra']:,})"
+            )
+        except Exception as e:
+            st.sidebar.info(f"Erro ao calcular Silhouette Score: {e}")
+        curvas_k = None
+        if usar_varredura_k and estrategia == "perfil_misto":
+            st.sidebar.caption("A varredura de k está disponível apenas para a estratégia de impacto nas vítimas.")
+        elif usar_varredura_k:
+            curvas_k = varrer_k_cacheado(
+                impressao_digital(df_filtered, FEATURES_IMPACTO), intervalo_k[0], intervalo_k[1],
+                None, amostra_silhouette or None, df_filtered
+            )
+            k_sugerido = sugerir_k(curvas_k)
+            if k_sugerido is not None:
+                st.sidebar.success(f"k sugerido (cotovelo da inércia): **{k_sugerido}**")
+
+        stats_cache = obter_cache_clustering().estatisticas()
+        st.sidebar.caption(f"Cache de clustering: {stats_cache['hits']} acertos / {stats_cache['misses']} falhas")
     except Exception as e:
         st.warning(f"Erro ao aplicar clustering: {e}")
         usar_clustering = False
 
 # --- Métricas Gerais ---
 st.markdown("### Métricas Gerais (com base nos filtros)")
+# Totais de intervalo respondidos pelas somas acumuladas do motor de séries temporais
+serie_temporal = carregar_serie_temporal()
+paises_kpi = selected_countries or None
+incidentes_por_pais = serie_temporal.totais_por_pais('Incidentes', paises_kpi, selected_year_range)
 col1, col2, col3 = st.columns(3)
-col1.metric("Total de Incidentes", f"{len(df_filtered):,}")
-col2.metric("Total de Vítimas", f"{int(df_filtered['Total Victims'].sum()):,}")
-col3.metric("Países Afetados", f"{df_filtered['Country'].nunique()}")
+col1.metric("Total de Incidentes", f"{int(incidentes_por_pais.sum()):,}")
+col2.metric("Total de Vítimas", f"{serie_temporal.total('Total Victims', paises_kpi, selected_year_range):,}")
+col3.metric("Países Afetados", f"{int((incidentes_por_pais > 0).sum())}")
+
+# Picos mensais de todos os países (cacheados por versão dos dados), restritos aos filtros
+anomalias = carregar_anomalias(limiar_alerta)
+picos = anomalias[anomalias['Mês'].dt.year.between(*selected_year_range)]
+if selected_countries:
+    picos = picos[picos['Country'].isin(selected_countries)]
 
 # --- Mapa Interativo ---
 st.markdown("---")
 st.subheader("Mapa Interativo de Incidentes")
 st.markdown("Use o scroll do mouse para dar zoom e clique e arraste para navegar.")
 
-if not df_filtered.empty:
-    center_lat = df_filtered.iloc[0]['Latitude'] if selected_countries else 25
-    center_lon = df_filtered.iloc[0]['Longitude'] if selected_countries else 10
-    zoom_level = 3 if selected_countries else 2
-
-    df_plot = df_filtered.copy()
-    df_plot['Marker Size'] = np.where(df_plot['Total Victims'] == 0, 10, df_plot['Total Victims'] + 10)
-
-    hover_cols = {
-        "Admin 1": True,
-        "Reported Perpetrator Name": True,
-        "Weapon Carried/Used": True,
-        "Total Victims": True,
-        "Total Killed": True,
-        "Total Arrested": True,
-        "Total Kidnapped": True,
-        "Total Injured": True,
-        "Sexual Violence Affecting School Age Children": True,
-        "Latitude": False,
-        "Longitude": False,
-        "Marker Size": False,
-    }
-
-    if usar_clustering and "Cluster" in df_plot.columns:
-        hover_cols["Cluster"] = True
-
-    fig_map = px.scatter_mapbox(
-        df_plot,
-        lat="Latitude",
-        lon="Longitude",
-        color="Cluster" if usar_clustering and "Cluster" in df_plot.columns else "Total Victims",
-        size="Marker Size",
-        hover_name="Country",
-        hover_data=hover_cols,
-        color_continuous_scale="Viridis" if not usar_clustering else None,
-        size_max=50,
-        zoom=zoom_level
-    )
+with etapa("grafico.mapa"):
+    if not df_filtered.empty:
+        center_lat = df_filtered.iloc[0]['Latitude'] if selected_countries else 25
+        center_lon = df_filtered.iloc[0]['Longitude'] if selected_countries else 10
+        zoom_level = 3 if selected_countries else 2
+
+        colorir_por_cluster = usar_clustering and "Cluster" in df_filtered.columns
+        if modo_mapa == "Agregado" or (modo_mapa == "Automático" and len(df_filtered) > limite_pontos_mapa):
+            # Agregação no servidor: uma célula da grade por marcador. Sem cores por
+            # cluster, a grade sai pronta do backend (GROUP BY no duckdb)
+            if colorir_por_cluster:
+                df_plot = agregar_pontos_mapa(df_filtered, zoom_level, coluna_categoria="Cluster")
+            else:
+                df_plot = backend.pontos_mapa(
+                    zoom_level, paises=selected_countries or None, intervalo_anos=selected_year_range
+                )
+            df_plot['Marker Size'] = np.sqrt(df_plot['Incidentes']) + 5
+            st.caption(
+                f"{len(df_filtered):,} incidentes agregados em {len(df_plot):,} células de "
+                f"{tamanho_celula_mapa(zoom_level):.1f}° (tamanho do marcador = nº de incidentes)."
+            )
+            hover_cols = {col: True for col in ["Incidentes"] + MAP_SUM_COLS}
+            hover_cols.update({"Latitude": False, "Longitude": False, "Marker Size": False})
+            hover_name = "País Principal"
+        else:
+            colunas_mapa = [
+                "Country", "Latitude", "Longitude", "Admin 1", "Reported Perpetrator Name",
+                "Weapon Carried/Used"
+            ] + MAP_SUM_COLS + (["Cluster"] if colorir_por_cluster else [])
+            df_plot = df_filtered[colunas_mapa].copy()
+            df_plot['Marker Size'] = np.where(df_plot['Total Victims'] == 0, 10, df_plot['Total Victims'].astype('int64') + 10)
+
+            hover_cols = {
+                "Admin 1": True,
+                "Reported Perpetrator Name": True,
+                "Weapon Carried/Used": True,
+                "Total Victims": True,
+                "Total Killed": True,
+                "Total Arrested": True,
+                "Total Kidnapped": True,
+                "Total Injured": True,
+                "Sexual Violence Affecting School Age Children": True,
+                "Latitude": False,
+                "Longitude": False,
+                "Marker Size": False,
+            }
+            hover_name = "Country"
+
+        if colorir_por_cluster:
+            hover_cols["Cluster"] = True
+
+        fig_map = px.scatter_mapbox(
+            df_plot,
+            lat="Latitude",
+            lon="Longitude",
+            color="Cluster" if colorir_por_cluster else "Total Victims",
+            size="Marker Size",
+            hover_name=hover_name,
+            hover_data=hover_cols,
+            color_continuous_scale="Viridis" if not usar_clustering else None,
+            size_max=50,
+            zoom=zoom_level
+        )
 
-    fig_map.update_layout(
-        mapbox_style="open-street-map",
-        mapbox_center={"lat": center_lat, "lon": center_lon},
-        height=600,
-        margin={"r":0,"t":20,"l":0,"b":0}
-    )
+        if destacar_picos_mapa and not picos.empty:
+            picos_mapa = posicionar_picos(df_filtered, picos)
+            fig_map.add_scattermapbox(
+                lat=picos_mapa['Latitude'],
+                lon=picos_mapa['Longitude'],
+                mode="markers",
+                marker=dict(size=np.clip(picos_mapa['Z robusto'] * 4, 16, 40), color="red", opacity=0.5),
+                hovertext=[
+                    f"{pais} {mes:%Y-%m}: {medida} = {valor:,} (base {base:g}, z {z:.1f})"
+                    for pais, mes, medida, valor, base, z in picos_mapa[
+                        ['Country', 'Mês', 'Medida', 'Valor', 'Linha de base', 'Z robusto']
+                    ].itertuples(index=False)
+                ],
+                hoverinfo="text",
+                name="Pico mensal",
+                showlegend=True,
+            )
+
+        fig_map.update_layout(
+            mapbox_style="open-street-map",
+            mapbox_center={"lat": center_lat, "lon": center_lon},
+            height=600,
+            margin={"r":0,"t":20,"l":0,"b":0}
+        )
     
-    st.plotly_chart(fig_map, use_container_width=True)
-else:
-    st.warning("Nenhum dado disponível para exibir o mapa com os filtros selecionados.")
+        st.plotly_chart(fig_map, use_container_width=True)
+    else:
+        st.warning("Nenhum dado disponível para exibir o mapa com os filtros selecionados.")
 
-# --- Gráficos por Cluster ---
-if usar_clustering and "Cluster" in df_filtered.columns:
-    st.markdown("---")
-    st.subheader("📊 Análise por Cluster")
-
-    st.markdown("**Soma dos Impactos por Cluster**")
-    df_impacto_grouped = df_filtered.groupby("Cluster").sum(numeric_only=True).reset_index()
-    df_impacto_grouped = df_impacto_grouped[[
-        "Cluster", "Total Killed", "Total Injured", "Total Kidnapped", "Total Arrested",
-        "Sexual Violence Affecting School Age Children"
-    ]].rename(columns={
-        "Sexual Violence Affecting School Age Children": "Sexual Violence"
-    })
-
-    st.markdown("**Distribuição Detalhada por Tipo de Impacto**")
-
-    colunas_impacto = [
-        "Total Killed",
-        "Total Injured",
-        "Total Kidnapped",
-        "Total Arrested",
-        "Sexual Violence Affecting School Age Children"
-    ]
-
-    for col in colunas_impacto:
-        fig = px.box(
-            df_filtered,
-            x="Cluster",
-            y=col,
-            title=f"{col} por Cluster",
-            labels={"Cluster": "Grupo (Cluster)", col: "Quantidade"}
+# --- Tendência Mensal ---
+st.markdown("---")
+st.subheader("📈 Tendência Mensal de Incidentes")
+
+with etapa("grafico.tendencia"):
+    col_medida, col_janela = st.columns(2)
+    medida_tendencia = col_medida.selectbox(
+        "Medida", ["Incidentes", "Total Victims", "Total Killed", "Total Injured", "Total Kidnapped", "Total Arrested"]
+    )
+    janela_media = col_janela.select_slider("Média móvel (meses)", options=[3, 6, 12], value=3)
+
+    serie_mensal = serie_temporal.serie_mensal([medida_tendencia], paises_kpi, selected_year_range)
+    if not serie_mensal.empty:
+        serie_mensal[f"Média móvel ({janela_media} meses)"] = media_movel(serie_mensal[medida_tendencia], janela_media)
+        fig_tendencia = px.line(
+            serie_mensal.reset_index().melt(id_vars="Mês", var_name="Série", value_name="Valor"),
+            x="Mês", y="Valor", color="Série", title=f"{medida_tendencia} por mês"
         )
-        st.plotly_chart(fig, use_container_width=True)
+        fig_tendencia.update_layout(xaxis_title=None, yaxis_title=medida_tendencia, legend_title=None)
+        st.plotly_chart(fig_tendencia, use_container_width=True)
+
+        st.markdown("**Comparação Ano a Ano**")
+        tabela_anual = comparativo_anual(serie_mensal, medida_tendencia)
+        col_linhas, col_tabela = st.columns([3, 2])
+        with col_linhas:
+            fig_anual = px.line(
+                tabela_anual.reset_index().melt(id_vars="Mês", var_name="Ano", value_name=medida_tendencia),
+                x="Mês", y=medida_tendencia, color="Ano", markers=True
+            )
+            fig_anual.update_layout(xaxis=dict(tickmode="array", tickvals=list(range(1, 13))))
+            st.plotly_chart(fig_anual, use_container_width=True)
+        with col_tabela:
+            # O último ano pode estar incompleto: a variação compara os mesmos meses de cada ano
+            ultimo_mes = int(tabela_anual[tabela_anual.columns[-1]].last_valid_index())
+            mesmo_periodo = tabela_anual.loc[:ultimo_mes].sum(min_count=1)
+            resumo = pd.DataFrame({
+                "Total no ano": tabela_anual.sum(min_count=1).astype("Int64"),
+                f"Jan–{ultimo_mes:02d}": mesmo_periodo.astype("Int64"),
+                "Variação (%)": (mesmo_periodo.pct_change() * 100).round(1),
+            })
+            resumo.index.name = "Ano"
+            st.dataframe(resumo, use_container_width=True)
+    else:
+        st.warning("Nenhum dado disponível para a tendência com os filtros selecionados.")
+
+# --- Alertas de Picos ---
+st.markdown("---")
+st.subheader("🚨 Alertas de Picos Mensais")
+st.markdown(
+    f"Meses em que o número de incidentes ou de vítimas de um país se afastou da sua própria linha de base "
+    f"(mediana dos {ANOMALIA_JANELA} meses anteriores) com z robusto de pelo menos {limiar_alerta:g}."
+)
 
+with etapa("grafico.alertas"):
+    if picos.empty:
+        st.info("Nenhum pico mensal detectado com os filtros selecionados.")
+    else:
+        st.caption(f"{len(picos):,} alerta(s) em {picos['Country'].nunique():,} país(es), do mais recente ao mais antigo.")
+        st.dataframe(
+            picos.assign(**{'Mês': picos['Mês'].dt.strftime('%Y-%m')}).round({'Linha de base': 1, 'Z robusto': 1}),
+            hide_index=True, use_container_width=True
+        )
 
-    df_impacto_melted = df_impacto_grouped.melt(
-        id_vars="Cluster",
-        var_name="Categoria",
-        value_name="Total"
-    )
+# --- Hotspots ---
+st.markdown("---")
+st.subheader("🔥 Hotspots de Incidentes")
+st.markdown(
+    f"Células de aproximadamente {tamanho_hotspot} km × {tamanho_hotspot} km com mais incidentes em cada país "
+    "(com base nos filtros). Incidentes com localização menos precisa que o tamanho da célula não entram na contagem."
+)
 
-    fig_impacto = px.bar(
-        df_impacto_melted,
-        x="Categoria",
-        y="Total",
-        color="Cluster",
-        barmode="group",
-        title="Comparativo de Impacto por Cluster"
-    )
-    st.plotly_chart(fig_impacto, use_container_width=True)
+with etapa("grafico.hotspots"):
+    if not df_filtered.empty:
+        hotspots, n_descartados = backend.hotspots(
+            tamanho_hotspot, hotspots_por_pais,
+            paises=selected_countries or None, intervalo_anos=selected_year_range
+        )
+        if n_descartados:
+            st.caption(
+                f"{n_descartados:,} incidente(s) com precisão geográfica maior que {tamanho_hotspot} km "
+                "(província, país ou censurada) foram desconsiderados."
+            )
+        if hotspots.empty:
+            st.info("Nenhum incidente com precisão suficiente para detectar hotspots com os filtros selecionados.")
+        else:
+            col_mapa_hotspots, col_tabela_hotspots = st.columns([3, 2])
+            with col_mapa_hotspots:
+                fig_hotspots = px.scatter_mapbox(
+                    hotspots,
+                    lat="Latitude",
+                    lon="Longitude",
+                    size="Incidentes",
+                    color="Total Victims",
+                    hover_name="Country",
+                    hover_data={"Incidentes": True, "Total Victims": True, "Latitude": False, "Longitude": False},
+                    color_continuous_scale="OrRd",
+                    size_max=40,
+                    zoom=zoom_level
+                )
+                fig_hotspots.update_layout(
+                    mapbox_style="open-street-map",
+                    mapbox_center={"lat": center_lat, "lon": center_lon},
+                    height=450,
+                    margin={"r":0,"t":20,"l":0,"b":0}
+                )
+                st.plotly_chart(fig_hotspots, use_container_width=True)
+            with col_tabela_hotspots:
+                st.dataframe(hotspots.round({"Latitude": 3, "Longitude": 3}), hide_index=True, use_container_width=True)
+
+        with st.expander("📍 Incidentes próximos a um ponto"):
+            # Por padrão, centrado no hotspot mais denso
+            lat_padrao = float(hotspots.iloc[0]['Latitude']) if not hotspots.empty else float(center_lat)
+            lon_padrao = float(hotspots.iloc[0]['Longitude']) if not hotspots.empty else float(center_lon)
+            col_lat, col_lon, col_raio = st.columns(3)
+            lat_busca = col_lat.number_input("Latitude", -90.0, 90.0, round(lat_padrao, 3), format="%.3f")
+            lon_busca = col_lon.number_input("Longitude", -180.0, 180.0, round(lon_padrao, 3), format="%.3f")
+            raio_busca = col_raio.number_input("Raio (km)", 1, 1000, 50)
+
+            proximos = backend.proximos(
+                lat_busca, lon_busca, raio_busca,
+                paises=selected_countries or None, intervalo_anos=selected_year_range
+            )
+            st.caption(f"{len(proximos):,} incidente(s) a até {raio_busca} km do ponto (com base nos filtros).")
+            if not proximos.empty:
+                st.dataframe(
+                    proximos[[
+                        "Date", "Country", "Admin 1", "Reported Perpetrator", "Total Victims",
+                        "Geo Precision", "Distância (km)"
+                    ]].round({"Distância (km)": 1}),
+                    hide_index=True, use_container_width=True
+                )
 
+# --- Gráficos por Cluster ---
+with etapa("grafico.clusters"):
+    if usar_clustering and "Cluster" in df_filtered.columns:
+        st.markdown("---")
+        st.subheader("📊 Análise por Cluster")
+
+        if curvas_k is not None and not curvas_k.empty:
+            st.markdown("**Escolha do Número de Grupos (varredura de k)**")
+            col_inercia, col_silhueta = st.columns(2)
+            with col_inercia:
+                fig_inercia = px.line(curvas_k, x="k", y="inercia", markers=True, title="Inércia por k (cotovelo)")
+                fig_inercia.update_layout(xaxis_title="Número de Grupos (k)", yaxis_title="Inércia")
+                st.plotly_chart(fig_inercia, use_container_width=True)
+            with col_silhueta:
+                fig_silhueta = px.line(curvas_k, x="k", y="silhouette", markers=True, title="Silhouette Score por k")
+                fig_silhueta.update_layout(xaxis_title="Número de Grupos (k)", yaxis_title="Silhouette Score")
+                st.plotly_chart(fig_silhueta, use_container_width=True)
+
+        if estrategia == "perfil_misto":
+            st.markdown("**Perfil Categórico por Cluster (valor mais frequente)**")
+            st.dataframe(perfil_categorico_clusters(df_filtered), hide_index=True, use_container_width=True)
+
+        st.markdown("**Soma dos Impactos por Cluster**")
+        df_impacto_grouped = df_filtered.groupby("Cluster").sum(numeric_only=True).reset_index()
+        df_impacto_grouped = df_impacto_grouped[[
+            "Cluster", "Total Killed", "Total Injured", "Total Kidnapped", "Total Arrested",
+            "Sexual Violence Affecting School Age Children"
+        ]].rename(columns={
+            "Sexual Violence Affecting School Age Children": "Sexual Violence"
+        })
+
+        st.markdown("**Distribuição Detalhada por Tipo de Impacto**")
+
+        colunas_impacto = [
+            "Total Killed",
+            "Total Injured",
+            "Total Kidnapped",
+            "Total Arrested",
+            "Sexual Violence Affecting School Age Children"
+        ]
+
+        for col in colunas_impacto:
+            fig = px.box(
+                df_filtered,
+                x="Cluster",
+                y=col,
+                title=f"{col} por Cluster",
+                labels={"Cluster": "Grupo (Cluster)", col: "Quantidade"}
+            )
+            st.plotly_chart(fig, use_container_width=True)
+
+
+        df_impacto_melted = df_impacto_grouped.melt(
+            id_vars="Cluster",
+            var_name="Categoria",
+            value_name="Total"
+        )
+
+        fig_impacto = px.bar(
+            df_impacto_melted,
+            x="Categoria",
+            y="Total",
+            color="Cluster",
+            barmode="group",
+            title="Comparativo de Impacto por Cluster"
+        )
+        st.plotly_chart(fig_impacto, use_container_width=True)
+
+if usar_clustering and "Cluster" in df_filtered.columns:
     # --- Texto explicativo ---
     st.markdown("---")
     st.subheader("🧠 Interpretação dos Grupos (Clusters)")
@@ -192,6 +473,14 @@ Agrupa incidentes com base em **dados quantitativos**:
 
 Esse agrupamento destaca **a severidade dos ataques**, permitindo identificar os clusters mais letais ou violentos.
 
+### 🧩 Agrupamento por Perfil Misto
+Combina as mesmas proporções de impacto com **atributos categóricos**:
+- País, perpetrador relatado, arma utilizada e tipo de instalação de ensino
+
+Usa o **KPrototypes**, que mede distância euclidiana nas proporções e conta os atributos categóricos diferentes.
+O modelo é ajustado em uma amostra dos incidentes e depois cada incidente é atribuído ao protótipo mais próximo,
+o que mantém a análise interativa mesmo com o dataset completo.
+
 ### 💡 Possíveis insights:
 - Regiões com **maior impacto humano** podem demandar mais intervenção humanitária.
 - Certos clusters podem representar **ameaças latentes**.
@@ -224,3 +513,5 @@ O Silhouette Score mede o quão bem separado e coeso está cada grupo:
 * Próximo de 0.0: os grupos estão se sobrepondo.
 * Valor negativo: os pontos estão no grupo errado.
 """)
+
+finalizar_rerun()
@@ -105,92 +105,2328 @@
 
 import streamlit as st
 import pandas as pd
+import numpy as np
+from scipy import sparse, stats
+from numpy.lib.stride_tricks import sliding_window_view
+from pandas.api.types import union_categoricals
+from pandas.io.parsers import TextParser
+import openpyxl
 import kagglehub
 import os
+import json
+import hashlib
+import inspect
+import shutil
+from datetime import datetime, timezone
+import functools
+import multiprocessing
+import threading
+import warnings
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import duckdb # Opcional: só necessário para o backend duckdb
+except ImportError:
+    duckdb = None
+
+from instrumentacao import etapa, instrumentar, registrar_cache
 
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
-from sklearn.metrics import silhouette_score
+from sklearn.metrics import silhouette_score, silhouette_samples
+from sklearn.neighbors import BallTree
+from kmodes.kprototypes import KPrototypes
+from sklearn import config_context as sklearn_config_context
+from threadpoolctl import threadpool_limits
 
-@st.cache_data
-def load_data():
+KAGGLE_HANDLE = "mohamedramadan2040/education-in-danger-incident-data-2020-to2025"
+XLSX_NAME = "2020-2025-education-in-danger-incident-data.xlsx"
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Cópia do dataset versionada junto com o repositório (usada quando o Kaggle está inacessível)
+BUNDLED_XLSX_PATH = os.path.join(BASE_DIR, XLSX_NAME)
+# Diretório do cache colunar (Parquet) do dataset já limpo
+CACHE_DIR = os.environ.get("EDU_DANGER_CACHE_DIR", os.path.join(BASE_DIR, ".cache"))
+CACHE_MANIFEST = "manifest.json"
+# Store incremental: o dataset base mais os incrementos ingeridos, em partes Parquet
+STORE_DIR = os.path.join(CACHE_DIR, "store")
+STORE_MANIFEST = "manifest.json"
+EVENT_ID_COL = 'SiND Event ID'
+# Artefatos pré-computados (ver precomputar.py): um subdiretório por versão e um ponteiro para a atual
+ARTIFACTS_DIR = os.environ.get("EDU_DANGER_ARTIFACTS_DIR", os.path.join(BASE_DIR, "artefatos"))
+ARTIFACTS_POINTER = "ATUAL"
+ARTIFACTS_FORMAT = 1
+
+# Seleção padrão da Visão Geral (também usada no clustering pré-computado)
+DEFAULT_COUNTRIES = ["Nigeria"]
+DEFAULT_N_CLUSTERS = 4
+
+# Colunas de texto com poucos valores distintos, armazenadas como categóricas
+CATEGORICAL_COLS = [
+    'Country', 'Country ISO', 'Admin 1', 'Geo Precision', 'Location of event',
+    'Reported Perpetrator', 'Reported Perpetrator Name', 'Weapon Carried/Used',
+    'Type of education facility'
+]
+# Contadores não negativos, reduzidos ao menor inteiro sem sinal que comporta os valores
+COUNTER_COLS = [
+    'Attacks on Schools', 'Attacks on Universities',
+    'Military Occupation of Education facility', 'Arson attack on education facility',
+    'Forced Entry into education facility', 'Damage/Destruction To Ed facility Event',
+    'Educators Killed', 'Educators Injured', 'Educators Kidnapped', 'Educators Arrested',
+    'Students Attacked in School', 'Students Killed', 'Students Injured',
+    'Students Kidnapped', 'Students Arrested',
+    'Sexual Violence Affecting School Age Children',
+    'Total Victims', 'Total Killed', 'Total Injured', 'Total Kidnapped', 'Total Arrested'
+]
+# Indicadores (0/1) do tipo de incidente
+INCIDENT_TYPE_COLS = [
+    'Attacks on Schools', 'Attacks on Universities',
+    'Military Occupation of Education facility', 'Arson attack on education facility',
+    'Forced Entry into education facility', 'Damage/Destruction To Ed facility Event',
+    'Attacks on Students and Teachers'
+]
+# Colunas de texto livre descartadas na limpeza (não entram nos blocos da ingestão em streaming)
+COLUNAS_TEXTO_LIVRE = [
+    'Event Description', 'Known Educators Kidnap Or Arrest Outcome',
+    'Known Student Kidnap Or Arrest Outcome'
+]
+# Linhas por bloco na leitura em streaming da planilha: limita o pico de memória da ingestão
+INGESTAO_BLOCO_LINHAS = int(os.environ.get("EDU_DANGER_CHUNK_ROWS", "20000"))
+# Dimensões do cubo de incidentes pré-agregado
+CUBE_DIMENSIONS = [
+    'Country', 'Year', 'Month', 'Reported Perpetrator',
+    'Weapon Carried/Used', 'Type of education facility'
+]
+
+
+def _hash_arquivo(path):
     """
-    Função para baixar o dataset do Kaggle, carregar em um DataFrame
-    e realizar a limpeza e pré-processamento iniciais.
-    Esta função é cacheada para alta performance entre as páginas.
+    Calcula o SHA-256 do conteúdo de um arquivo, lendo em blocos.
+    """
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloco in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+@functools.lru_cache(maxsize=1)
+def _hash_limpeza():
+    """
+    Hash do código-fonte da limpeza: qualquer alteração na lógica invalida o cache.
+    Calculado uma vez por processo (o código não muda com o servidor no ar).
+    """
+    h = hashlib.sha256()
+    for func in (limpar_dados, compactar_tipos, ler_planilha_em_blocos, _valor_celula):
+        h.update(inspect.getsource(func).encode('utf-8'))
+    h.update(repr((CATEGORICAL_COLS, COUNTER_COLS, COLUNAS_TEXTO_LIVRE)).encode('utf-8'))
+    return h.hexdigest()
+
+
+def _localizar_fonte():
     """
-    # Baixar o dataset (requer autenticação do Kaggle configurada)
-    path = kagglehub.dataset_download("mohamedramadan2040/education-in-danger-incident-data-2020-to2025")
-    xlsx_path = os.path.join(path, "2020-2025-education-in-danger-incident-data.xlsx")
-    df = pd.read_excel(xlsx_path, engine='openpyxl')
+    Retorna o caminho do xlsx de origem. Tenta o Kaggle primeiro e recorre
+    à cópia local do repositório quando o download falha (ex.: sem rede).
+    """
+    if os.environ.get("EDU_DANGER_OFFLINE") != "1":
+        try:
+            with etapa("load_data.download_kaggle"):
+                path = kagglehub.dataset_download(KAGGLE_HANDLE)
+            xlsx_path = os.path.join(path, XLSX_NAME)
+            if os.path.exists(xlsx_path):
+                return xlsx_path
+        except Exception:
+            pass
+    return BUNDLED_XLSX_PATH
+
+
+def _caminho_cache(chave):
+    return os.path.join(CACHE_DIR, f"incidentes-{chave}.parquet")
+
+
+def _ler_manifesto():
+    try:
+        with open(os.path.join(CACHE_DIR, CACHE_MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _gravar_cache(df, chave, fonte):
+    """
+    Persiste o DataFrame limpo em Parquet e atualiza o manifesto.
+    Falhas de escrita (ex.: sistema de arquivos somente leitura) são ignoradas.
+    """
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        destino = _caminho_cache(chave)
+        tmp = destino + ".tmp"
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, destino)
+        stat = os.stat(fonte)
+        manifesto = {
+            "chave": chave,
+            "fonte": fonte,
+            "fonte_tamanho": stat.st_size,
+            "fonte_mtime": stat.st_mtime,
+            "parquet": os.path.basename(destino),
+        }
+        with open(os.path.join(CACHE_DIR, CACHE_MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump(manifesto, f, indent=2)
+    except Exception:
+        pass
+
+
+def _carregar_cache_quente():
+    """
+    Carrega o Parquet registrado no manifesto sem acessar a rede, desde que
+    o arquivo de origem e a lógica de limpeza não tenham mudado.
+    """
+    manifesto = _ler_manifesto()
+    if not manifesto:
+        return None
+    fonte = manifesto.get("fonte")
+    parquet = os.path.join(CACHE_DIR, manifesto.get("parquet", ""))
+    if not fonte or not os.path.exists(fonte) or not os.path.exists(parquet):
+        return None
+    stat = os.stat(fonte)
+    if stat.st_size != manifesto.get("fonte_tamanho") or stat.st_mtime != manifesto.get("fonte_mtime"):
+        return None
+    if not manifesto.get("chave", "").endswith(_hash_limpeza()[:16]):
+        return None
+    try:
+        return pd.read_parquet(parquet)
+    except Exception:
+        return None
 
-    # --- Limpeza e Processamento dos Dados ---
+
+def limpar_dados(df):
+    """
+    Limpeza e pré-processamento do DataFrame bruto lido do xlsx.
+    """
     df_clean = df.copy()
-    
-    cols_to_drop = [
-        'Event Description', 'Known Educators Kidnap Or Arrest Outcome',
-        'Known Student Kidnap Or Arrest Outcome', 'SiND Event ID'
-    ]
-    df_clean.drop(columns=cols_to_drop, inplace=True)
 
-    df_clean['Admin 1'].fillna('Desconhecido', inplace=True)
-    df_clean['Location of event'].fillna('Desconhecido', inplace=True)
+    # errors='ignore': a leitura em blocos e os incrementos em CSV não trazem as colunas de texto livre
+    df_clean.drop(columns=COLUNAS_TEXTO_LIVRE, inplace=True, errors='ignore')
+
+    df_clean['Admin 1'] = df_clean['Admin 1'].fillna('Desconhecido')
+    df_clean['Location of event'] = df_clean['Location of event'].fillna('Desconhecido')
     df_clean.dropna(subset=['Latitude', 'Longitude'], inplace=True)
+    df_clean.reset_index(drop=True, inplace=True)
 
     df_clean['Year'] = df_clean['Date'].dt.year
-    
+    df_clean['Month'] = df_clean['Date'].dt.month
+
     victim_cols = [
         'Educators Killed', 'Educators Injured', 'Educators Kidnapped', 'Educators Arrested',
         'Students Killed', 'Students Injured', 'Students Kidnapped', 'Students Arrested'
     ]
     df_clean['Total Victims'] = df_clean[victim_cols].sum(axis=1)
-    
+
     # --- Totais de categorias relevantes ---
     df_clean['Total Killed'] = df_clean['Educators Killed'] + df_clean['Students Killed']
     df_clean['Total Injured'] = df_clean['Educators Injured'] + df_clean['Students Injured']
     df_clean['Total Kidnapped'] = df_clean['Educators Kidnapped'] + df_clean['Students Kidnapped']
     df_clean['Total Arrested'] = df_clean['Educators Arrested'] + df_clean['Students Arrested']
 
-    return df_clean
+    return compactar_tipos(df_clean)
 
 
-def aplicar_clustering(df, n_clusters=4):
-    df_cluster = df.copy()
+def compactar_tipos(df):
+    """
+    Converte o DataFrame limpo para um esquema compacto: textos repetitivos viram
+    categóricas, contadores viram inteiros sem sinal e Year/Month viram int16/int8.
+    Deve ser chamada depois do cálculo dos totais, para evitar overflow nas somas.
+    """
+    for col in CATEGORICAL_COLS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            # Texto antes da categórica: um bloco com a coluna toda vazia seria inferido
+            # como float e geraria categorias float, incompatíveis com as dos outros blocos
+            df[col] = df[col].astype('str').astype('category')
+    for col in COUNTER_COLS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], downcast='unsigned')
+    if 'Year' in df.columns:
+        df['Year'] = df['Year'].astype('int16')
+    if 'Month' in df.columns:
+        df['Month'] = df['Month'].astype('int8')
+    return df
 
-    # Novas features relativas
-    df_cluster['Pct_Killed'] = df_cluster['Total Killed'] / (df_cluster['Total Victims'] + 1)
-    df_cluster['Pct_Injured'] = df_cluster['Total Injured'] / (df_cluster['Total Victims'] + 1)
-    df_cluster['Pct_Kidnapped'] = df_cluster['Total Kidnapped'] / (df_cluster['Total Victims'] + 1)
-    df_cluster['Pct_Arrested'] = df_cluster['Total Arrested'] / (df_cluster['Total Victims'] + 1)
-    df_cluster['Pct_Sexual'] = df_cluster['Sexual Violence Affecting School Age Children'] / (df_cluster['Total Victims'] + 1)
-
-    features = [
-        'Pct_Killed', 'Pct_Injured', 'Pct_Kidnapped', 'Pct_Arrested', 'Pct_Sexual'
-    ]
 
-    transformer = ColumnTransformer([
-        ('num', StandardScaler(), features),
-    ])
+def _valor_celula(valor):
+    """
+    Mesma conversão de célula do leitor openpyxl do pandas: vazia vira "" e número inteiro vira int.
+    """
+    if valor is None:
+        return ""
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
 
-    pipeline = Pipeline([
-        ('transform', transformer),
-        ('cluster', KMeans(n_clusters=n_clusters, random_state=42, n_init='auto'))
-    ])
 
-    cluster_labels = pipeline.fit_predict(df_cluster[features])
-    df_cluster['Cluster'] = cluster_labels
+def ler_planilha_em_blocos(caminho, tamanho_bloco=INGESTAO_BLOCO_LINHAS):
+    """
+    Lê a planilha (xlsx ou CSV) em blocos de até tamanho_bloco linhas, sem as
+    colunas de texto livre. No xlsx, as linhas vêm do openpyxl em modo read_only
+    e cada bloco passa pelo mesmo TextParser usado por pd.read_excel, de modo que
+    os tipos inferidos são os mesmos da leitura completa.
+    """
+    if caminho.lower().endswith('.csv'):
+        yield from pd.read_csv(
+            caminho, parse_dates=['Date'], usecols=lambda col: col not in COLUNAS_TEXTO_LIVRE,
+            chunksize=tamanho_bloco
+        )
+        return
 
-    return df_cluster
+    livro = openpyxl.load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        planilha = livro.worksheets[0]
+        planilha.reset_dimensions() # Dimensões gravadas no arquivo podem estar erradas
+        linhas = planilha.iter_rows(values_only=True)
+        cabecalho = next(linhas, None)
+        if cabecalho is None:
+            return
+        manter = [i for i, nome in enumerate(cabecalho) if nome is not None and nome not in COLUNAS_TEXTO_LIVRE]
+        nomes = [cabecalho[i] for i in manter]
+
+        bloco = []
+        for linha in linhas:
+            valores = [_valor_celula(linha[i]) if i < len(linha) else "" for i in manter]
+            if all(v == "" for v in valores):
+                continue
+            bloco.append(valores)
+            if len(bloco) >= tamanho_bloco:
+                yield TextParser([nomes] + bloco, header=0).read()
+                bloco = []
+        if bloco:
+            yield TextParser([nomes] + bloco, header=0).read()
+    finally:
+        livro.close()
 
-def avaliar_clustering(df, labels, features_usadas):
+
+def ler_planilha_limpa(caminho, tamanho_bloco=INGESTAO_BLOCO_LINHAS):
     """
-    Calcula o Silhouette Score com base nos dados e rótulos de cluster.
+    Ingestão em streaming: cada bloco é limpo e compactado assim que é lido, e
+    só os blocos já compactados ficam em memória. O pico de memória depende do
+    tamanho do bloco, não do tamanho do arquivo.
+    """
+    blocos = [limpar_dados(bruto) for bruto in ler_planilha_em_blocos(caminho, tamanho_bloco)]
+    if not blocos:
+        raise ValueError(f"Planilha sem linhas de dados: {caminho}")
+    if len(blocos) == 1 or not any(len(b) for b in blocos):
+        return blocos[0]
+
+    df = concatenar_incidentes(blocos)
+    # Mesma ordem de categorias da leitura completa (astype('category') ordena os valores)
+    for col in CATEGORICAL_COLS:
+        if col in df.columns:
+            df[col] = df[col].cat.set_categories(sorted(df[col].cat.categories))
+    return df
+
+
+def carregar_dataset_base():
     """
+    Carrega o dataset limpo usando o cache Parquet em disco sempre que possível.
+    A chave do cache combina o hash do arquivo de origem e o hash da lógica de limpeza;
+    só na falta de cache o xlsx é lido (em blocos, com openpyxl).
+    """
+    with etapa("load_data.cache_parquet") as registro:
+        df = _carregar_cache_quente()
+        registro.cache = "hit" if df is not None else "miss"
+    if df is not None:
+        return df
+
+    fonte = _localizar_fonte()
+    chave = f"{_hash_arquivo(fonte)[:16]}-{_hash_limpeza()[:16]}"
+    destino = _caminho_cache(chave)
+    if os.path.exists(destino):
+        try:
+            df = pd.read_parquet(destino)
+        except Exception:
+            df = None
+        if df is not None:
+            _gravar_cache(df, chave, fonte)
+            return df
+
+    with etapa("load_data.leitura_excel") as registro:
+        # Leitura e limpeza bloco a bloco (ver ler_planilha_limpa)
+        df = ler_planilha_limpa(fonte)
+        registro.linhas_saida = len(df)
+    _gravar_cache(df, chave, fonte)
+    return df
+
+
+def _ler_manifesto_store():
     try:
-        score = silhouette_score(df[features_usadas], labels)
-        return round(score, 3)
-    except Exception as e:
-        return f"Erro ao calcular Silhouette Score: {e}"
+        with open(os.path.join(STORE_DIR, STORE_MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _gravar_manifesto_store(manifesto):
+    tmp = os.path.join(STORE_DIR, STORE_MANIFEST + ".tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=2)
+    os.replace(tmp, os.path.join(STORE_DIR, STORE_MANIFEST))
+
+
+def versao_dados():
+    """
+    Versão atual dos dados: muda a cada incremento ingerido no store.
+    Usada como chave dos caches do Streamlit.
+    """
+    manifesto = _ler_manifesto_store()
+    return manifesto["versao"] if manifesto else 0
+
+
+def unificar_categorias(frames, colunas):
+    """
+    Alinha as categorias das colunas categóricas de vários DataFrames (união),
+    para que o pd.concat preserve o dtype category.
+    """
+    # Cópias rasas: só as colunas categóricas são substituídas (copy-on-write), sem copiar os dados
+    frames = [f.copy(deep=False) for f in frames]
+    for col in colunas:
+        series = [f[col] for f in frames if col in f.columns]
+        if not series or not all(isinstance(x.dtype, pd.CategoricalDtype) for x in series):
+            continue
+        categorias = union_categoricals(series, ignore_order=True).categories
+        for f in frames:
+            if col in f.columns:
+                f[col] = f[col].cat.set_categories(categorias)
+    return frames
+
+
+def concatenar_incidentes(frames):
+    """
+    Concatena DataFrames limpos mantendo o esquema compacto.
+    """
+    frames = unificar_categorias([f for f in frames if len(f)], CATEGORICAL_COLS)
+    return compactar_tipos(pd.concat(frames, ignore_index=True))
+
+
+def carregar_dataset():
+    """
+    Carrega o dataset servido pelo dashboard: o store incremental, quando existe,
+    ou o dataset base (ver carregar_dataset_base).
+    """
+    artefatos = localizar_artefatos()
+    if artefatos is not None:
+        diretorio, _ = artefatos
+        return pd.read_parquet(os.path.join(diretorio, "dataset.parquet"), memory_map=True)
+    manifesto = _ler_manifesto_store()
+    if manifesto is None:
+        return carregar_dataset_base()
+    partes = [pd.read_parquet(os.path.join(STORE_DIR, parte)) for parte in manifesto["partes"]]
+    return concatenar_incidentes(partes)
+
+
+@functools.lru_cache(maxsize=4)
+def _checksums_conferem(diretorio, arquivos):
+    """
+    Confere (uma vez por processo) os SHA-256 registrados no manifesto dos artefatos.
+    """
+    return all(
+        os.path.exists(os.path.join(diretorio, nome)) and _hash_arquivo(os.path.join(diretorio, nome)) == sha
+        for nome, sha in arquivos
+    )
+
+
+@functools.lru_cache(maxsize=4)
+def _ler_artefatos(assinatura_ponteiro):
+    """
+    Lê o ponteiro e o manifesto da versão atual dos artefatos (uma vez por
+    assinatura do arquivo ponteiro, que é substituído a cada precomputar_artefatos).
+    """
+    try:
+        with open(os.path.join(ARTIFACTS_DIR, ARTIFACTS_POINTER), encoding='utf-8') as f:
+            diretorio = os.path.join(ARTIFACTS_DIR, f.read().strip())
+        with open(os.path.join(diretorio, "manifest.json"), encoding='utf-8') as f:
+            return diretorio, json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def localizar_artefatos():
+    """
+    Devolve (diretório, manifesto) da versão atual dos artefatos pré-computados,
+    ou None quando não existem, estão desatualizados (outra versão dos dados ou da
+    lógica de limpeza) ou falham na conferência de checksums.
+
+    Chamada a cada rerun: só um stat do ponteiro; os JSON são relidos quando ele muda.
+    """
+    try:
+        estado = os.stat(os.path.join(ARTIFACTS_DIR, ARTIFACTS_POINTER))
+    except OSError:
+        return None
+    lidos = _ler_artefatos((estado.st_ino, estado.st_mtime_ns, estado.st_size))
+    if lidos is None:
+        return None
+    diretorio, manifesto = lidos
+    if (manifesto.get("formato") != ARTIFACTS_FORMAT
+            or manifesto.get("versao_dados") != versao_dados()
+            or manifesto.get("hash_limpeza") != _hash_limpeza()):
+        return None
+    if not _checksums_conferem(diretorio, tuple(sorted(manifesto["arquivos"].items()))):
+        return None
+    return diretorio, manifesto
+
+
+def _coluna_somente_leitura(serie):
+    """
+    Valores da coluna com o array NumPy marcado como somente leitura (sem cópia).
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Categorical.codes é uma visão (somente leitura) dos códigos, sem cópia
+        codigos = serie.array.codes
+        return pd.Categorical.from_codes(codigos, dtype=serie.dtype)
+    if isinstance(serie.dtype, np.dtype) and serie.dtype != object:
+        valores = serie.to_numpy()
+        valores.flags.writeable = False
+        return valores
+    # Tipos de extensão (ex.: str do pyarrow, imutável) seguem como estão
+    return serie.array
+
+
+def somente_leitura(df):
+    """
+    Devolve o DataFrame com os arrays NumPy de cada coluna (inclusive os códigos
+    das categóricas e os valores das datas) marcados como somente leitura, para
+    que o dataset compartilhado entre sessões não possa ser alterado no lugar: uma
+    escrita direta falha, e cópias rasas (copy-on-write) copiam a coluna antes de
+    alterá-la. Usa só a API pública: o DataFrame é remontado coluna a coluna, sem
+    copiar os dados e sem consolidar os arrays em blocos novos (graváveis).
+    """
+    colunas = {coluna: _coluna_somente_leitura(df[coluna]) for coluna in df.columns}
+    return pd.DataFrame(colunas, index=df.index, columns=df.columns, copy=False)
+
+
+@st.cache_resource(max_entries=2)
+def _load_data(versao):
+    # Só executa em falha do cache do Streamlit.
+    # cache_resource (e não cache_data): todas as sessões e páginas recebem o mesmo
+    # objeto, sem a cópia/desserialização que o cache_data faz a cada chamada.
+    registrar_cache(False)
+    return somente_leitura(carregar_dataset())
+
+
+@instrumentar("load_data", cacheado=True)
+def load_data():
+    """
+    Função para baixar o dataset do Kaggle, carregar em um DataFrame
+    e realizar a limpeza e pré-processamento iniciais.
+    Esta função é cacheada para alta performance entre as páginas,
+    e o resultado limpo também é persistido em Parquet (ver carregar_dataset).
+    O cache é indexado pela versão dos dados, que muda a cada incremento ingerido.
+
+    O DataFrame devolvido é compartilhado por todas as sessões e seus arrays são
+    somente leitura (escritas no lugar falham). Atribuir uma coluna ainda alteraria
+    o objeto compartilhado: filtre com aplicar_filtros (que devolve um novo
+    DataFrame) ou faça uma cópia rasa antes de adicionar ou substituir colunas.
+    """
+    return _load_data(versao_dados())
+
+
+def calcular_metadados(df):
+    """
+    Lista de países e limites de ano usados nos filtros da barra lateral.
+    """
+    return {
+        "paises": sorted(str(p) for p in df['Country'].unique()),
+        "ano_min": int(df['Year'].min()),
+        "ano_max": int(df['Year'].max()),
+    }
+
+
+@st.cache_resource(max_entries=2)
+def _metadados_dataset(versao):
+    return calcular_metadados(_load_data(versao))
+
+
+def metadados_dataset():
+    """
+    Metadados dos filtros, resolvidos pelo backend de consultas (no backend
+    pandas, lidos dos artefatos pré-computados quando existem).
+    """
+    return obter_backend().metadados()
+
+
+def precomputar_artefatos(manter=3):
+    """
+    Gera uma nova versão dos artefatos servidos pelo dashboard: dataset limpo,
+    cubo, metadados dos filtros e o clustering da seleção padrão, com um manifesto
+    de checksums. Ao final, aponta ARTIFACTS_POINTER para a nova versão e remove
+    as versões mais antigas além de `manter`. Devolve o diretório criado.
+
+    Grava em ARTIFACTS_DIR (EDU_DANGER_ARTIFACTS_DIR), o mesmo diretório lido por
+    localizar_artefatos.
+    """
+    destino = ARTIFACTS_DIR
+    df = carregar_dataset()
+    metadados = calcular_metadados(df)
+
+    versao = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    diretorio = os.path.join(destino, versao)
+    os.makedirs(diretorio)
+
+    df.to_parquet(os.path.join(diretorio, "dataset.parquet"), index=False)
+    construir_cubo(df).to_parquet(os.path.join(diretorio, "cubo.parquet"), index=False)
+
+    indice = IndiceFiltros(df)
+    paises = [p for p in DEFAULT_COUNTRIES if p in metadados["paises"]] or None
+    df_padrao = df.take(indice.posicoes(paises, (metadados["ano_min"], metadados["ano_max"])))
+    df_padrao = pd.concat([df_padrao, calcular_features_impacto(df_padrao)], axis=1)
+    chave = chave_clustering(df_padrao, DEFAULT_N_CLUSTERS, FEATURES_IMPACTO)
+    resultado = ajustar_clustering(df_padrao, DEFAULT_N_CLUSTERS, FEATURES_IMPACTO)
+    np.savez(os.path.join(diretorio, "clustering_padrao.npz"), **resultado)
+
+    arquivos = ["dataset.parquet", "cubo.parquet", "clustering_padrao.npz"]
+    manifesto = {
+        "formato": ARTIFACTS_FORMAT,
+        "versao": versao,
+        "versao_dados": versao_dados(),
+        "hash_limpeza": _hash_limpeza(),
+        "n_linhas": len(df),
+        "metadados": metadados,
+        "clustering_padrao": {
+            "impressao": chave[0], "n_clusters": chave[1], "features": list(chave[2]),
+        },
+        "arquivos": {nome: _hash_arquivo(os.path.join(diretorio, nome)) for nome in arquivos},
+    }
+    with open(os.path.join(diretorio, "manifest.json"), 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=2, ensure_ascii=False)
+
+    ponteiro = os.path.join(destino, ARTIFACTS_POINTER)
+    with open(ponteiro + ".tmp", 'w', encoding='utf-8') as f:
+        f.write(versao)
+    os.replace(ponteiro + ".tmp", ponteiro)
+
+    versoes = sorted(d for d in os.listdir(destino) if os.path.isdir(os.path.join(destino, d)))
+    for antiga in versoes[:-manter] if manter else []:
+        shutil.rmtree(os.path.join(destino, antiga), ignore_errors=True)
+    return diretorio
+
+
+class IndiceFiltros:
+    """
+    Índice de filtros construído uma única vez sobre o DataFrame de load_data.
+    Guarda as posições das linhas de cada país e bitmaps (compactados com
+    np.packbits) por ano e por mês, de forma que qualquer combinação
+    países × intervalo de anos × meses é resolvida por operações bit a bit,
+    sem avaliar strings de consulta a cada rerun.
+    """
+
+    def __init__(self, df):
+        self.n_linhas = len(df)
+        # Referência fraca ao DataFrame indexado: o índice só vale para esse objeto
+        self._origem = weakref.ref(df)
+        paises = df['Country'].astype('category')
+        codigos = paises.cat.codes.to_numpy()
+        ordem = np.argsort(codigos, kind='stable')
+        limites = np.searchsorted(codigos[ordem], np.arange(len(paises.cat.categories) + 1))
+        self.posicoes_pais = {
+            pais: ordem[limites[i]:limites[i + 1]].astype(np.int32)
+            for i, pais in enumerate(paises.cat.categories)
+        }
+
+        anos = df['Year'].to_numpy()
+        meses = df['Month'].to_numpy()
+        self.bitmaps_ano = {int(a): np.packbits(anos == a) for a in np.unique(anos)}
+        self.bitmaps_mes = {int(m): np.packbits(meses == m) for m in np.unique(meses)}
+        self.todos = np.packbits(np.ones(self.n_linhas, dtype=bool))
+
+    def indexa(self, df):
+        """
+        Indica se o índice foi construído sobre este mesmo objeto df.
+        """
+        return self._origem() is df
+
+    def _bitmap_paises(self, paises):
+        mascara = np.zeros(self.n_linhas, dtype=bool)
+        for pais in paises:
+            posicoes = self.posicoes_pais.get(pais)
+            if posicoes is not None:
+                mascara[posicoes] = True
+        return np.packbits(mascara)
+
+    def _uniao(self, bitmaps, selecionados):
+        resultado = np.zeros_like(self.todos)
+        for chave in selecionados:
+            bitmap = bitmaps.get(chave)
+            if bitmap is not None:
+                resultado |= bitmap
+        return resultado
+
+    def mascara(self, paises=None, intervalo_anos=None, meses=None):
+        """
+        Retorna a máscara booleana das linhas selecionadas.
+        paises=None seleciona todos os países; uma lista vazia não seleciona nenhum.
+        """
+        bitmap = self.todos.copy()
+        if paises is not None:
+            bitmap &= self._bitmap_paises(paises)
+        if intervalo_anos is not None:
+            inicio, fim = intervalo_anos
+            bitmap &= self._uniao(self.bitmaps_ano, range(int(inicio), int(fim) + 1))
+        if meses is not None:
+            bitmap &= self._uniao(self.bitmaps_mes, meses)
+        return np.unpackbits(bitmap, count=self.n_linhas).astype(bool)
+
+    def posicoes(self, paises=None, intervalo_anos=None, meses=None):
+        """
+        Retorna as posições (iloc) das linhas selecionadas.
+        """
+        return np.flatnonzero(self.mascara(paises, intervalo_anos, meses))
+
+
+@st.cache_resource(max_entries=2)
+def _carregar_indice_filtros(versao):
+    registrar_cache(False)
+    return IndiceFiltros(_load_data(versao))
+
+
+@instrumentar("filtros.indice", cacheado=True)
+def carregar_indice_filtros():
+    """
+    Constrói (uma vez por processo e versão dos dados) o índice de filtros sobre o dataset de load_data.
+    """
+    return _carregar_indice_filtros(versao_dados())
+
+
+@instrumentar("filtros")
+def aplicar_filtros(df, paises=None, intervalo_anos=None, meses=None, colunas=None):
+    """
+    API de filtros compartilhada pelas páginas: resolve a seleção da barra
+    lateral pelo IndiceFiltros e devolve as linhas correspondentes de df.
+
+    A seleção completa é uma visão rasa (sem cópia); uma seleção parcial copia as
+    linhas selecionadas, por isso passe `colunas` para copiar apenas as colunas usadas.
+    """
+    indice = carregar_indice_filtros()
+    if not indice.indexa(df):
+        # Outro DataFrame (mesmo que com o mesmo número de linhas): índice próprio
+        indice = IndiceFiltros(df)
+    posicoes = indice.posicoes(paises, intervalo_anos, meses)
+    if colunas is not None:
+        # Seleção de colunas antes do take: o take só copia as colunas pedidas
+        df = df[list(colunas)]
+    if len(posicoes) == len(df):
+        # Seleção completa: visão rasa do dataset compartilhado, sem copiar as colunas
+        return df.copy(deep=False)
+    return df.take(posicoes)
+
+
+def matrizes_tipo(df):
+    """
+    Devolve as matrizes (linhas × INCIDENT_TYPE_COLS) de contagem e de vítimas por tipo.
+
+    Em linhas de incidentes, a contagem é a matriz indicadora (tipo > 0) e as
+    vítimas são o 'Total Victims' da linha onde o indicador vale 1. Em células do
+    cubo, as mesmas matrizes já estão materializadas nas colunas de tipo e
+    'Vítimas | <tipo>'.
+    """
+    colunas_vitimas = [f'Vítimas | {col}' for col in INCIDENT_TYPE_COLS]
+    if all(col in df.columns for col in colunas_vitimas):
+        contagens = df[INCIDENT_TYPE_COLS].to_numpy(dtype='int64')
+        vitimas = df[colunas_vitimas].to_numpy(dtype='int64')
+    else:
+        # dtype explícito: a mistura de colunas uint8 e bool viraria uma matriz object
+        contagens = (df[INCIDENT_TYPE_COLS].to_numpy(dtype='int64') > 0).astype('int64')
+        vitimas = contagens * df['Total Victims'].to_numpy(dtype='int64')[:, None]
+    return contagens, vitimas
+
+
+def estatisticas_por_tipo(df, por=None):
+    """
+    Contagem, soma de vítimas e média de vítimas por incidente de cada tipo de
+    incidente, opcionalmente por grupo (ex.: por='Country' ou por='Year').
+
+    Aceita tanto linhas de incidentes quanto células do cubo. As matrizes de tipo
+    são montadas uma única vez e somadas por grupo num só produto matricial
+    (matriz esparsa de pertinência grupo × linha). Devolve um DataFrame longo com
+    as colunas [por,] 'Tipo', 'Incidentes', 'Vítimas' e 'Média de Vítimas'.
+    """
+    contagens, vitimas = matrizes_tipo(df)
+    matriz = np.hstack([contagens, vitimas]).astype('float64')
+    n_tipos = len(INCIDENT_TYPE_COLS)
+
+    if por is None:
+        somas = matriz.sum(axis=0, keepdims=True)
+        grupos = None
+    else:
+        codigos, grupos = pd.factorize(df[por], sort=True)
+        validos = codigos >= 0
+        pertinencia = sparse.csr_matrix(
+            (np.ones(validos.sum()), (codigos[validos], np.flatnonzero(validos))),
+            shape=(len(grupos), len(df))
+        )
+        somas = np.asarray(pertinencia @ matriz)
+
+    n_incidentes = somas[:, :n_tipos]
+    soma_vitimas = somas[:, n_tipos:]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        medias = np.where(n_incidentes > 0, soma_vitimas / n_incidentes, np.nan)
+
+    resultado = pd.DataFrame({
+        'Tipo': np.tile(INCIDENT_TYPE_COLS, len(somas)),
+        'Incidentes': n_incidentes.ravel().astype('int64'),
+        'Vítimas': soma_vitimas.ravel().astype('int64'),
+        'Média de Vítimas': medias.ravel(),
+    })
+    if grupos is not None:
+        resultado.insert(0, por, np.repeat(np.asarray(grupos), n_tipos))
+    return resultado
+
+
+def construir_cubo(df):
+    """
+    Materializa o cubo de incidentes: uma linha por combinação observada de
+    CUBE_DIMENSIONS, com o número de incidentes ('Incidentes'), a soma dos
+    contadores e, para cada tipo de incidente, a soma de vítimas dos incidentes
+    desse tipo ('Vítimas | <tipo>'), usada no cálculo de severidade.
+    """
+    medidas = pd.DataFrame(index=df.index)
+    medidas['Incidentes'] = 1
+    for col in COUNTER_COLS + ['Attacks on Students and Teachers']:
+        medidas[col] = df[col].astype('int64')
+    _, vitimas_por_tipo = matrizes_tipo(df)
+    for j, col in enumerate(INCIDENT_TYPE_COLS):
+        medidas[f'Vítimas | {col}'] = vitimas_por_tipo[:, j]
+
+    chaves = df[CUBE_DIMENSIONS]
+    cubo = (
+        pd.concat([chaves, medidas], axis=1)
+        .groupby(CUBE_DIMENSIONS, observed=True, dropna=False, sort=False)
+        .sum()
+        .reset_index()
+    )
+    return cubo
+
+
+def atualizar_cubo(cubo, delta):
+    """
+    Incorpora as linhas novas de `delta` a um cubo existente, somando as células
+    coincidentes. O custo depende do número de células e do tamanho do delta,
+    não do histórico de incidentes.
+    """
+    frames = unificar_categorias([cubo, construir_cubo(delta)], CUBE_DIMENSIONS)
+    return (
+        pd.concat(frames, ignore_index=True)
+        .groupby(CUBE_DIMENSIONS, observed=True, dropna=False, sort=False)
+        .sum()
+        .reset_index()
+    )
+
+
+@st.cache_resource(max_entries=2)
+def _carregar_cubo(versao):
+    registrar_cache(False)
+    artefatos = localizar_artefatos()
+    manifesto = _ler_manifesto_store()
+    if artefatos is not None:
+        cubo = pd.read_parquet(os.path.join(artefatos[0], "cubo.parquet"), memory_map=True)
+    elif manifesto is not None and manifesto.get("cubo"):
+        cubo = pd.read_parquet(os.path.join(STORE_DIR, manifesto["cubo"]))
+    else:
+        cubo = construir_cubo(_load_data(versao))
+    return cubo, IndiceFiltros(cubo)
+
+
+@instrumentar("cubo", cacheado=True)
+def carregar_cubo():
+    """
+    Constrói (uma vez por processo e versão dos dados) o cubo de incidentes e o
+    índice de filtros sobre ele. Com o store incremental, usa o cubo persistido.
+    """
+    return _carregar_cubo(versao_dados())
+
+
+def ler_incremento(caminho):
+    """
+    Lê e limpa um incremento do dataset (xlsx ou CSV no mesmo layout da planilha original).
+    """
+    return ler_planilha_limpa(caminho)
+
+
+def _ids_evento(df):
+    """
+    IDs de evento ordenados e únicos; linhas sem 'SiND Event ID' não entram no store.
+    """
+    return np.unique(df[EVENT_ID_COL].dropna().to_numpy(dtype='int64'))
+
+
+def _descartar_sem_id(df):
+    """
+    Descarta (com aviso) as linhas sem 'SiND Event ID': sem ID não há como deduplicar o evento.
+    """
+    sem_id = df[EVENT_ID_COL].isna()
+    if sem_id.any():
+        warnings.warn(f"{int(sem_id.sum())} linha(s) sem '{EVENT_ID_COL}' descartada(s) na ingestão")
+        df = df[~sem_id].reset_index(drop=True)
+    return df
+
+
+def _caminho_ids(manifesto):
+    # Stores anteriores ao versionamento dos IDs usam um único ids.npy
+    return os.path.join(STORE_DIR, manifesto.get("ids", "ids.npy"))
+
+
+def inicializar_store(df=None):
+    """
+    Cria o store incremental a partir do dataset base (parte 0), com o cubo
+    e os IDs de evento já conhecidos.
+    """
+    if df is None:
+        df = carregar_dataset_base()
+    os.makedirs(STORE_DIR, exist_ok=True)
+    df.to_parquet(os.path.join(STORE_DIR, "parte-00000.parquet"), index=False)
+    construir_cubo(df).to_parquet(os.path.join(STORE_DIR, "cubo-00000.parquet"), index=False)
+    np.save(os.path.join(STORE_DIR, "ids-00000.npy"), _ids_evento(df))
+    manifesto = {
+        "versao": 1,
+        "partes": ["parte-00000.parquet"],
+        "cubo": "cubo-00000.parquet",
+        "ids": "ids-00000.npy",
+        "n_linhas": len(df),
+    }
+    _gravar_manifesto_store(manifesto)
+    return manifesto
+
+
+def ingerir_incremento(caminho):
+    """
+    Ingestão incremental de uma nova versão/parte dos dados.
+
+    Descarta os eventos cujo 'SiND Event ID' já está no store (e as linhas sem ID),
+    grava somente as linhas novas como uma nova parte Parquet e grava novas versões
+    do cubo e da lista de IDs. Os totais derivados são calculados apenas para as
+    linhas do incremento. Os arquivos antigos só são removidos depois que o manifesto
+    aponta para os novos (uma interrupção antes disso mantém o store na versão
+    anterior, sem IDs registrados de uma parte ausente), e os da versão anterior
+    ficam até a próxima ingestão, para que um dashboard que acabou de ler o manifesto
+    anterior ainda encontre o cubo. Devolve o número de linhas novas.
+    """
+    manifesto = _ler_manifesto_store() or inicializar_store()
+
+    delta = _descartar_sem_id(ler_incremento(caminho))
+    delta = delta.drop_duplicates(subset=[EVENT_ID_COL])
+    ids = np.load(_caminho_ids(manifesto))
+    ids_delta = delta[EVENT_ID_COL].to_numpy(dtype='int64')
+    posicoes = np.clip(np.searchsorted(ids, ids_delta), 0, max(len(ids) - 1, 0))
+    ja_existe = (ids[posicoes] == ids_delta) if len(ids) else np.zeros(len(delta), dtype=bool)
+    delta = delta[~ja_existe].reset_index(drop=True)
+    if delta.empty:
+        return 0
+
+    versao = manifesto["versao"] + 1
+    parte = f"parte-{versao:05d}.parquet"
+    delta.to_parquet(os.path.join(STORE_DIR, parte), index=False)
+
+    cubo_anterior = pd.read_parquet(os.path.join(STORE_DIR, manifesto["cubo"]))
+    nome_cubo = f"cubo-{versao:05d}.parquet"
+    atualizar_cubo(cubo_anterior, delta).to_parquet(os.path.join(STORE_DIR, nome_cubo), index=False)
+    nome_ids = f"ids-{versao:05d}.npy"
+    np.save(os.path.join(STORE_DIR, nome_ids), np.union1d(ids, _ids_evento(delta)))
+
+    # A versão anterior continua em disco: processos que leram o manifesto anterior ainda abrem seus arquivos
+    arquivos_em_uso = {manifesto["cubo"], os.path.basename(_caminho_ids(manifesto)), nome_cubo, nome_ids}
+    manifesto.update({
+        "versao": versao,
+        "partes": manifesto["partes"] + [parte],
+        "cubo": nome_cubo,
+        "ids": nome_ids,
+        "n_linhas": manifesto["n_linhas"] + len(delta),
+    })
+    _gravar_manifesto_store(manifesto)
+    _remover_versoes_antigas(arquivos_em_uso)
+    return len(delta)
+
+
+def _remover_versoes_antigas(arquivos_em_uso):
+    """
+    Remove os cubos e listas de IDs do store que não pertencem às versões em uso
+    (a atual e a anterior).
+    """
+    for nome in os.listdir(STORE_DIR):
+        versionado = (nome.startswith("cubo-") and nome.endswith(".parquet")) or (
+            nome.startswith("ids") and nome.endswith(".npy")
+        )
+        if versionado and nome not in arquivos_em_uso:
+            try:
+                os.remove(os.path.join(STORE_DIR, nome))
+            except FileNotFoundError:
+                pass
+
+
+@instrumentar("cubo.filtros")
+def filtrar_cubo(paises=None, intervalo_anos=None, meses=None):
+    """
+    Equivalente de aplicar_filtros para o cubo: devolve as células selecionadas.
+    """
+    cubo, indice = carregar_cubo()
+    return cubo.take(indice.posicoes(paises, intervalo_anos, meses))
+
+
+def agregar_cubo(cubo, por=None, medidas=None):
+    """
+    Roll-up do cubo: soma as medidas agrupando pelas dimensões em `por`.
+    Sem `por`, devolve uma Series com os totais das medidas.
+    """
+    if medidas is None:
+        medidas = [c for c in cubo.columns if c not in CUBE_DIMENSIONS]
+    if por is None:
+        return cubo[medidas].sum()
+    return cubo.groupby(por, observed=True)[medidas].sum()
+
+
+def ranking_cubo(cubo, dimensao, n=None, medida='Incidentes'):
+    """
+    Ranking decrescente de uma dimensão do cubo pela medida indicada.
+    """
+    ranking = agregar_cubo(cubo, dimensao, [medida])[medida]
+    ranking = ranking[ranking > 0].sort_values(ascending=False)
+    return ranking.head(n) if n is not None else ranking
+
+
+# --- Séries temporais (somas acumuladas por país × mês) ---
+SERIE_MEDIDAS = ['Incidentes', 'Total Victims', 'Total Killed', 'Total Injured', 'Total Kidnapped', 'Total Arrested']
+
+
+class SerieTemporal:
+    """
+    Motor de séries temporais construído uma única vez a partir do cubo: para cada
+    medida, uma matriz países × meses de somas acumuladas (com uma coluna de zeros
+    à esquerda). O total de qualquer intervalo [início, fim] de um país é a
+    diferença de duas posições da matriz, e a série mensal de um conjunto de
+    países é a soma das suas linhas seguida de np.diff, sem reagregar incidentes.
+    """
+
+    def __init__(self, cubo, medidas=SERIE_MEDIDAS):
+        self.medidas = list(medidas)
+        # Eixo do tempo: do primeiro ao último mês com incidentes (meses como ano * 12 + mês - 1)
+        codigo_mes = cubo['Year'].to_numpy(dtype='int64') * 12 + cubo['Month'].to_numpy(dtype='int64') - 1
+        self._mes_inicial = int(codigo_mes.min())
+        self.n_meses = int(codigo_mes.max()) - self._mes_inicial + 1
+        self.meses = pd.period_range(
+            pd.Period(year=self._mes_inicial // 12, month=self._mes_inicial % 12 + 1, freq='M'),
+            periods=self.n_meses, freq='M'
+        )
+
+        paises = cubo['Country'].astype('category')
+        self.paises = list(paises.cat.categories)
+        self._posicao_pais = {pais: i for i, pais in enumerate(self.paises)}
+        linha = paises.cat.codes.to_numpy()
+        coluna = codigo_mes - self._mes_inicial
+
+        self.acumulados = {}
+        for medida in self.medidas:
+            mensal = np.zeros((len(self.paises), self.n_meses), dtype=np.int64)
+            np.add.at(mensal, (linha, coluna), cubo[medida].to_numpy(dtype='int64'))
+            acumulado = np.zeros((len(self.paises), self.n_meses + 1), dtype=np.int64)
+            np.cumsum(mensal, axis=1, out=acumulado[:, 1:])
+            self.acumulados[medida] = acumulado
+        # Soma acumulada de todos os países: atalho para a seleção "todos"
+        self._acumulados_todos = {m: a.sum(axis=0) for m, a in self.acumulados.items()}
+
+    def _linhas(self, paises):
+        return [self._posicao_pais[p] for p in paises if p in self._posicao_pais]
+
+    def _colunas(self, intervalo_anos=None):
+        """
+        Converte um intervalo de anos (inclusivo) nas colunas [início, fim) das matrizes acumuladas.
+        """
+        if intervalo_anos is None:
+            return 0, self.n_meses
+        inicio, fim = intervalo_anos
+        inicio = min(max(int(inicio) * 12 - self._mes_inicial, 0), self.n_meses)
+        fim = min(max((int(fim) + 1) * 12 - self._mes_inicial, inicio), self.n_meses)
+        return inicio, fim
+
+    def _acumulado(self, medida, paises):
+        if paises is None:
+            return self._acumulados_todos[medida]
+        return self.acumulados[medida][self._linhas(paises)].sum(axis=0)
+
+    def total(self, medida='Incidentes', paises=None, intervalo_anos=None):
+        """
+        Total da medida no intervalo de anos para os países (None = todos).
+        """
+        inicio, fim = self._colunas(intervalo_anos)
+        if paises is None:
+            acumulado = self._acumulados_todos[medida]
+            return int(acumulado[fim] - acumulado[inicio])
+        acumulado = self.acumulados[medida]
+        linhas = self._linhas(paises)
+        return int((acumulado[linhas, fim] - acumulado[linhas, inicio]).sum())
+
+    def totais_por_pais(self, medida='Incidentes', paises=None, intervalo_anos=None):
+        """
+        Total da medida no intervalo, por país (Series indexada pelo país).
+        """
+        inicio, fim = self._colunas(intervalo_anos)
+        linhas = np.arange(len(self.paises)) if paises is None else np.array(self._linhas(paises), dtype=np.intp)
+        acumulado = self.acumulados[medida]
+        return pd.Series(
+            acumulado[linhas, fim] - acumulado[linhas, inicio],
+            index=pd.Index([self.paises[i] for i in linhas], name='Country'), name=medida
+        )
+
+    def matriz_mensal(self, medida='Incidentes'):
+        """
+        Valores mensais da medida, países × meses (np.diff das somas acumuladas).
+        """
+        return np.diff(self.acumulados[medida], axis=1)
+
+    def serie_mensal(self, medidas=('Incidentes',), paises=None, intervalo_anos=None):
+        """
+        Série mensal das medidas para o conjunto de países (None = todos), com um
+        mês por linha (inclusive os meses sem incidentes) e índice 'Mês' (Timestamp).
+        """
+        inicio, fim = self._colunas(intervalo_anos)
+        serie = pd.DataFrame(
+            {m: np.diff(self._acumulado(m, paises)[inicio:fim + 1]) for m in medidas},
+            index=pd.Index(self.meses[inicio:fim].to_timestamp(), name='Mês')
+        )
+        return serie
+
+
+@st.cache_resource(max_entries=4)
+def _carregar_serie_temporal(versao, nome_backend):
+    registrar_cache(False)
+    mensal = _obter_backend(nome_backend, versao).consulta().agregar(['Country', 'Year', 'Month'], SERIE_MEDIDAS)
+    return SerieTemporal(mensal.reset_index())
 
+
+@instrumentar("serie_temporal", cacheado=True)
+def carregar_serie_temporal():
+    """
+    Constrói (uma vez por processo, versão dos dados e backend) o motor de séries
+    temporais a partir das contagens país × ano × mês devolvidas pelo backend.
+    """
+    return _carregar_serie_temporal(versao_dados(), BACKEND_PADRAO)
+
+
+def media_movel(serie, janela):
+    """
+    Média móvel (meses) de uma série mensal; os primeiros meses usam a janela disponível.
+    """
+    return serie.rolling(janela, min_periods=1).mean()
+
+
+def comparativo_anual(serie, medida='Incidentes'):
+    """
+    Reorganiza uma série mensal em uma tabela mês do ano × ano, para a comparação ano a ano.
+    """
+    tabela = pd.DataFrame({
+        'Ano': serie.index.year, 'Mês': serie.index.month, medida: serie[medida].to_numpy()
+    })
+    return tabela.pivot(index='Mês', columns='Ano', values=medida)
+
+
+# --- Motores de consulta (backends) ---
+# "pandas": DataFrame completo em memória + índices e cubo (padrão).
+# "duckdb": consultas SQL sobre os arquivos Parquet do dataset, sem materializá-lo;
+# filtros e agregações rodam no motor e só os resultados (pequenos) voltam ao pandas.
+BACKEND_PADRAO = os.environ.get("EDU_DANGER_BACKEND", "pandas")
+BACKENDS = ["pandas", "duckdb"]
+# Medidas do cubo, na ordem de construir_cubo
+MEDIDAS_CUBO = (
+    ['Incidentes'] + COUNTER_COLS + ['Attacks on Students and Teachers']
+    + [f'Vítimas | {col}' for col in INCIDENT_TYPE_COLS]
+)
+
+
+def arquivos_dataset():
+    """
+    Arquivos Parquet que compõem a versão atual do dataset limpo: o dataset dos
+    artefatos, as partes do store incremental ou o cache do dataset base.
+    """
+    artefatos = localizar_artefatos()
+    if artefatos is not None:
+        return [os.path.join(artefatos[0], "dataset.parquet")]
+    manifesto = _ler_manifesto_store()
+    if manifesto is not None:
+        return [os.path.join(STORE_DIR, parte) for parte in manifesto["partes"]]
+    if _carregar_cache_quente() is None:
+        carregar_dataset_base() # Grava o cache Parquet
+    manifesto = _ler_manifesto()
+    if not manifesto or not os.path.exists(os.path.join(CACHE_DIR, manifesto.get("parquet", ""))):
+        raise RuntimeError(f"Cache Parquet indisponível em {CACHE_DIR}: necessário para o backend duckdb.")
+    return [os.path.join(CACHE_DIR, manifesto["parquet"])]
+
+
+class ConsultaCubo:
+    """
+    Consulta agregada sobre o cubo em memória (backend pandas): uma seleção de
+    células com as operações usadas pelos gráficos.
+    """
+
+    def __init__(self, cubo):
+        self.cubo = cubo
+
+    @property
+    def vazia(self):
+        return self.cubo.empty
+
+    def agregar(self, por=None, medidas=None):
+        return agregar_cubo(self.cubo, por, medidas)
+
+    def ranking(self, dimensao, n=None, medida='Incidentes'):
+        return ranking_cubo(self.cubo, dimensao, n, medida)
+
+    def restringir(self, dimensao, valores):
+        return ConsultaCubo(self.cubo[self.cubo[dimensao].isin(list(valores))])
+
+    def estatisticas_por_tipo(self, por=None):
+        return estatisticas_por_tipo(self.cubo, por)
+
+
+class BackendPandas:
+    """
+    Backend padrão: o DataFrame de load_data, filtrado pelo IndiceFiltros, e o cubo pré-agregado.
+    """
+
+    nome = "pandas"
+
+    def linhas(self, paises=None, intervalo_anos=None, meses=None, colunas=None):
+        return aplicar_filtros(load_data(), paises, intervalo_anos, meses, colunas)
+
+    def consulta(self, paises=None, intervalo_anos=None, meses=None):
+        return ConsultaCubo(filtrar_cubo(paises, intervalo_anos, meses))
+
+    def proximos(self, lat, lon, raio_km, paises=None, intervalo_anos=None, meses=None, precisao_max_km=None):
+        return consultar_raio(load_data(), lat, lon, raio_km, paises, intervalo_anos, meses, precisao_max_km)
+
+    def pontos_mapa(self, zoom, paises=None, intervalo_anos=None, meses=None, colunas_soma=None):
+        colunas_soma = MAP_SUM_COLS if colunas_soma is None else list(colunas_soma)
+        colunas = ['Country', 'Latitude', 'Longitude'] + colunas_soma
+        return agregar_pontos_mapa(self.linhas(paises, intervalo_anos, meses, colunas), zoom, colunas_soma)
+
+    def hotspots(self, tamanho_km, n_por_pais, paises=None,
+                 intervalo_anos=None, meses=None, precisao_max_km=None):
+        colunas = ['Country', 'Latitude', 'Longitude', 'Total Victims', 'Geo Precision']
+        return detectar_hotspots(self.linhas(paises, intervalo_anos, meses, colunas), tamanho_km, n_por_pais, precisao_max_km)
+
+    def metadados(self):
+        artefatos = localizar_artefatos()
+        if artefatos is not None:
+            return artefatos[1]["metadados"]
+        return _metadados_dataset(versao_dados())
+
+
+def _coluna_sql(nome):
+    return '"' + nome.replace('"', '""') + '"'
+
+
+def _condicoes_sql(paises=None, intervalo_anos=None, meses=None):
+    """
+    Traduz os filtros da barra lateral em condições SQL parametrizadas.
+    """
+    condicoes, parametros = [], []
+    if paises is not None:
+        condicoes.append('list_contains(?, "Country")')
+        parametros.append([str(p) for p in paises])
+    if intervalo_anos is not None:
+        condicoes.append('"Year" BETWEEN ? AND ?')
+        parametros.extend([int(intervalo_anos[0]), int(intervalo_anos[1])])
+    if meses is not None:
+        condicoes.append('list_contains(?, "Month")')
+        parametros.append([int(m) for m in meses])
+    return condicoes, parametros
+
+
+def _expressao_medida(medida):
+    """
+    Expressão SQL de uma medida do cubo sobre as linhas de incidentes.
+    """
+    if medida == 'Incidentes':
+        return 'COUNT(*)'
+    if medida.startswith('Vítimas | '):
+        tipo = _coluna_sql(medida[len('Vítimas | '):])
+        return f'CAST(COALESCE(SUM(CASE WHEN CAST({tipo} AS INTEGER) > 0 THEN "Total Victims" ELSE 0 END), 0) AS BIGINT)'
+    return f'CAST(COALESCE(SUM(CAST({_coluna_sql(medida)} AS BIGINT)), 0) AS BIGINT)'
+
+
+class ConsultaDuckDB:
+    """
+    Consulta agregada executada pelo DuckDB sobre o Parquet: mesma interface de
+    ConsultaCubo, mas cada operação vira um GROUP BY com os filtros no WHERE.
+    """
+
+    def __init__(self, backend, condicoes=(), parametros=()):
+        self.backend = backend
+        self.condicoes = list(condicoes)
+        self.parametros = list(parametros)
+
+    def _where(self, extras=()):
+        condicoes = self.condicoes + list(extras)
+        return " WHERE " + " AND ".join(condicoes) if condicoes else ""
+
+    @property
+    def vazia(self):
+        sql = f"SELECT NOT EXISTS (SELECT 1 FROM incidentes{self._where()})"
+        return bool(self.backend.executar(sql, self.parametros).fetchone()[0])
+
+    def agregar(self, por=None, medidas=None):
+        if medidas is None:
+            medidas = MEDIDAS_CUBO
+        selecao = ", ".join(f"{_expressao_medida(m)} AS {_coluna_sql(m)}" for m in medidas)
+        if por is None:
+            sql = f"SELECT {selecao} FROM incidentes{self._where()}"
+            return self.backend.executar(sql, self.parametros).df().iloc[0]
+
+        grupos = [por] if isinstance(por, str) else list(por)
+        colunas = ", ".join(_coluna_sql(g) for g in grupos)
+        # Como no groupby do pandas, grupos com chave nula são descartados
+        nao_nulos = [f"{_coluna_sql(g)} IS NOT NULL" for g in grupos]
+        sql = (
+            f"SELECT {colunas}, {selecao} FROM incidentes{self._where(nao_nulos)} "
+            f"GROUP BY {colunas} ORDER BY {colunas}"
+        )
+        return self.backend.executar(sql, self.parametros).df().set_index(por)
+
+    def ranking(self, dimensao, n=None, medida='Incidentes'):
+        coluna = _coluna_sql(dimensao)
+        sql = (
+            f"SELECT {coluna}, {_expressao_medida(medida)} AS valor FROM incidentes"
+            f"{self._where([f'{coluna} IS NOT NULL'])} GROUP BY {coluna} HAVING valor > 0 "
+            f"ORDER BY valor DESC, {coluna}" + (f" LIMIT {int(n)}" if n is not None else "")
+        )
+        resultado = self.backend.executar(sql, self.parametros).df()
+        return resultado.set_index(dimensao)['valor'].rename(medida)
+
+    def restringir(self, dimensao, valores):
+        return ConsultaDuckDB(
+            self.backend,
+            self.condicoes + [f"list_contains(?, {_coluna_sql(dimensao)})"],
+            self.parametros + [[str(v) for v in valores]]
+        )
+
+    def estatisticas_por_tipo(self, por=None):
+        medidas = INCIDENT_TYPE_COLS + [f'Vítimas | {col}' for col in INCIDENT_TYPE_COLS]
+        agregado = self.agregar(por, medidas)
+        celulas = agregado.to_frame().T if por is None else agregado.reset_index()
+        return estatisticas_por_tipo(celulas, por)
+
+
+class BackendDuckDB:
+    """
+    Backend colunar: uma view DuckDB sobre os arquivos Parquet do dataset. Os
+    filtros e os GROUP BY são resolvidos pelo motor, lendo só as colunas usadas.
+    """
+
+    nome = "duckdb"
+
+    def __init__(self, arquivos):
+        if duckdb is None:
+            raise RuntimeError("O backend duckdb requer o pacote duckdb (pip install duckdb).")
+        self.arquivos = list(arquivos)
+        self._conexao = duckdb.connect()
+        lista = ", ".join("'" + a.replace("'", "''") + "'" for a in self.arquivos)
+        self._conexao.execute(
+            f"CREATE VIEW incidentes AS SELECT * FROM read_parquet([{lista}], union_by_name = true)"
+        )
+
+    def executar(self, sql, parametros=()):
+        # Um cursor por consulta: as sessões do Streamlit rodam em threads diferentes
+        return self._conexao.cursor().execute(sql, list(parametros))
+
+    def linhas(self, paises=None, intervalo_anos=None, meses=None, colunas=None):
+        condicoes, parametros = _condicoes_sql(paises, intervalo_anos, meses)
+        selecao = "*" if colunas is None else ", ".join(_coluna_sql(c) for c in colunas)
+        where = " WHERE " + " AND ".join(condicoes) if condicoes else ""
+        return compactar_tipos(self.executar(f"SELECT {selecao} FROM incidentes{where}", parametros).df())
+
+    def consulta(self, paises=None, intervalo_anos=None, meses=None):
+        return ConsultaDuckDB(self, *_condicoes_sql(paises, intervalo_anos, meses))
+
+    def proximos(self, lat, lon, raio_km, paises=None, intervalo_anos=None, meses=None, precisao_max_km=None):
+        """
+        Pré-filtra pelo retângulo que contém o círculo no SQL e aplica a distância exata no resultado.
+        """
+        condicoes, parametros = _condicoes_sql(paises, intervalo_anos, meses)
+        delta_lat = raio_km / KM_POR_GRAU
+        condicoes.append('"Latitude" BETWEEN ? AND ?')
+        parametros.extend([lat - delta_lat, lat + delta_lat])
+        cos_lat = np.cos(np.radians(min(abs(lat) + delta_lat, 90.0)))
+        delta_lon = delta_lat / cos_lat if cos_lat > 1e-6 else 360.0
+        if delta_lon < 180.0:
+            lon_min = (lon - delta_lon + 180.0) % 360.0 - 180.0
+            lon_max = (lon + delta_lon + 180.0) % 360.0 - 180.0
+            operador = "AND" if lon_min <= lon_max else "OR" # Cruza o antimeridiano
+            condicoes.append(f'("Longitude" >= ? {operador} "Longitude" <= ?)')
+            parametros.extend([lon_min, lon_max])
+
+        candidatos = self.executar(
+            f"SELECT * FROM incidentes WHERE {' AND '.join(condicoes)}", parametros
+        ).df()
+        distancias = distancia_haversine_km(lat, lon, candidatos['Latitude'].to_numpy(), candidatos['Longitude'].to_numpy())
+        manter = distancias <= raio_km
+        if precisao_max_km is not None:
+            manter &= precisao_em_km(candidatos['Geo Precision']) <= precisao_max_km
+        ordem = np.flatnonzero(manter)[np.argsort(distancias[manter], kind='stable')]
+        resultado = compactar_tipos(candidatos.take(ordem))
+        resultado['Distância (km)'] = distancias[ordem]
+        return resultado
+
+    def pontos_mapa(self, zoom, paises=None, intervalo_anos=None, meses=None, colunas_soma=None):
+        """
+        Mesma grade de agregar_pontos_mapa, calculada num GROUP BY: só as células voltam do DuckDB.
+        """
+        condicoes, parametros = _condicoes_sql(paises, intervalo_anos, meses)
+        condicoes += ['"Latitude" IS NOT NULL', '"Longitude" IS NOT NULL']
+        lado = tamanho_celula_mapa(zoom)
+        colunas_soma = MAP_SUM_COLS if colunas_soma is None else list(colunas_soma)
+        somas = ", ".join(
+            f"CAST(SUM({_coluna_sql(c)}) AS BIGINT) AS {_coluna_sql(c)}" for c in colunas_soma
+        )
+        sql = (
+            f'SELECT CAST(FLOOR(("Latitude" + 90.0) / {lado!r}) AS BIGINT) * {int(360.0 / lado) + 1}'
+            f' + CAST(FLOOR(("Longitude" + 180.0) / {lado!r}) AS BIGINT) AS "Célula", {somas},'
+            ' COUNT(*) AS "Incidentes", AVG("Latitude") AS "Latitude", AVG("Longitude") AS "Longitude",'
+            ' CAST(mode("Country") AS VARCHAR) AS "País Principal"'
+            f' FROM incidentes WHERE {" AND ".join(condicoes)} GROUP BY 1 ORDER BY 1'
+        )
+        return self.executar(sql, parametros).df()
+
+    def hotspots(self, tamanho_km, n_por_pais, paises=None,
+                 intervalo_anos=None, meses=None, precisao_max_km=None):
+        """
+        Mesmos hotspots de detectar_hotspots, com a grade, o filtro de precisão e o
+        top n por país resolvidos no SQL. Devolve (hotspots, n_descartados).
+        """
+        if precisao_max_km is None:
+            precisao_max_km = tamanho_km
+        codigos_precisos = [codigo for codigo, km in PRECISAO_GEO_KM.items() if km <= precisao_max_km]
+        condicoes, parametros = _condicoes_sql(paises, intervalo_anos, meses)
+        where = " WHERE " + " AND ".join(condicoes) if condicoes else ""
+        altura = tamanho_km / KM_POR_GRAU
+        sql = f"""
+            WITH base AS (
+                SELECT "Country", "Latitude", "Longitude", "Total Victims",
+                       COALESCE(list_contains(?, TRY_CAST(
+                           regexp_extract("Geo Precision", '^\\s*\\((\\d+)\\)', 1) AS INTEGER
+                       )), false) AS preciso
+                FROM incidentes{where}
+            ),
+            celulas AS (
+                SELECT "Country", "Latitude", "Longitude", "Total Victims",
+                       FLOOR(("Latitude" + 90.0) / {altura!r}) AS faixa
+                FROM base WHERE preciso
+            ),
+            grade AS (
+                SELECT "Country", faixa,
+                       FLOOR(("Longitude" + 180.0) / ({altura!r} / GREATEST(
+                           COS(RADIANS((faixa + 0.5) * {altura!r} - 90.0)), 1e-3
+                       ))) AS coluna,
+                       "Latitude", "Longitude", "Total Victims"
+                FROM celulas
+            ),
+            hotspots AS (
+                SELECT CAST("Country" AS VARCHAR) AS "Country", COUNT(*) AS "Incidentes",
+                       CAST(SUM("Total Victims") AS BIGINT) AS "Total Victims",
+                       AVG("Latitude") AS "Latitude", AVG("Longitude") AS "Longitude", faixa, coluna
+                FROM grade GROUP BY "Country", faixa, coluna
+            )
+            SELECT "Country", "Incidentes", "Total Victims", "Latitude", "Longitude",
+                   (SELECT COUNT(*) FROM base WHERE NOT preciso) AS descartados
+            FROM hotspots
+            QUALIFY ROW_NUMBER() OVER (
+                PARTITION BY "Country" ORDER BY "Incidentes" DESC, "Total Victims" DESC, faixa, coluna
+            ) <= {int(n_por_pais)}
+            ORDER BY "Incidentes" DESC, "Total Victims" DESC, "Country", faixa, coluna
+        """
+        resultado = self.executar(sql, [codigos_precisos] + parametros).df()
+        if resultado.empty:
+            descartados = self.executar(
+                f"SELECT COUNT(*) FROM incidentes{where}", parametros
+            ).fetchone()[0]
+            return resultado.drop(columns='descartados'), int(descartados)
+        n_descartados = int(resultado['descartados'].iloc[0])
+        return resultado.drop(columns='descartados'), n_descartados
+
+    def metadados(self):
+        paises = self.executar(
+            'SELECT DISTINCT "Country" FROM incidentes WHERE "Country" IS NOT NULL ORDER BY 1'
+        ).fetchall()
+        ano_min, ano_max = self.executar('SELECT MIN("Year"), MAX("Year") FROM incidentes').fetchone()
+        return {"paises": [str(p[0]) for p in paises], "ano_min": int(ano_min), "ano_max": int(ano_max)}
+
+
+@st.cache_resource(max_entries=4)
+def _obter_backend(nome, versao):
+    registrar_cache(False)
+    if nome == "pandas":
+        return BackendPandas()
+    if nome == "duckdb":
+        return BackendDuckDB(arquivos_dataset())
+    raise ValueError(f"Backend desconhecido: {nome!r} (opções: {', '.join(BACKENDS)})")
+
+
+@instrumentar("backend", cacheado=True)
+def obter_backend(nome=None):
+    """
+    Backend de consultas (uma instância por processo, nome e versão dos dados).
+    Sem nome, usa EDU_DANGER_BACKEND (padrão: pandas).
+    """
+    return _obter_backend(nome or BACKEND_PADRAO, versao_dados())
+
+
+# Acima deste número de pontos o mapa passa a mostrar células agregadas
+MAP_RAW_POINTS_THRESHOLD = int(os.environ.get("EDU_DANGER_MAP_RAW_THRESHOLD", "2000"))
+# Células da grade por "tile" do mapa: o tamanho da célula acompanha o nível de zoom
+MAP_CELLS_PER_TILE = 16
+MAP_SUM_COLS = [
+    'Total Victims', 'Total Killed', 'Total Injured', 'Total Kidnapped', 'Total Arrested',
+    'Sexual Violence Affecting School Age Children'
+]
+
+
+def tamanho_celula_mapa(zoom):
+    """
+    Lado (em graus) da célula da grade para um nível de zoom do mapa.
+    """
+    return 360.0 / (2 ** zoom * MAP_CELLS_PER_TILE)
+
+
+def agregar_pontos_mapa(df, zoom, colunas_soma=MAP_SUM_COLS, coluna_categoria=None):
+    """
+    Agrega os incidentes numa grade lat/lon cuja resolução depende do zoom.
+
+    Cada célula traz o número de incidentes, as somas de `colunas_soma`, o
+    centróide dos pontos (para posicionar o marcador) e o país mais frequente.
+    Com `coluna_categoria` (ex.: 'Cluster'), inclui também a categoria predominante.
+    """
+    lado = tamanho_celula_mapa(zoom)
+    lat = df['Latitude'].to_numpy(dtype='float64')
+    lon = df['Longitude'].to_numpy(dtype='float64')
+    celula = pd.Series(
+        np.floor((lat + 90.0) / lado).astype(np.int64) * (int(360.0 / lado) + 1)
+        + np.floor((lon + 180.0) / lado).astype(np.int64),
+        index=df.index, name='Célula'
+    )
+
+    base = df[colunas_soma].astype('int64')
+    base['Incidentes'] = 1
+    base['Latitude'] = lat
+    base['Longitude'] = lon
+    agrupado = base.groupby(celula)
+    agregado = agrupado[colunas_soma + ['Incidentes']].sum()
+    agregado[['Latitude', 'Longitude']] = agrupado[['Latitude', 'Longitude']].mean()
+
+    predominantes = [('Country', 'País Principal')]
+    if coluna_categoria is not None:
+        predominantes.append((coluna_categoria, coluna_categoria))
+    for coluna, nome in predominantes:
+        contagem = pd.DataFrame({'Célula': celula.to_numpy(), nome: df[coluna].to_numpy()})
+        contagem = contagem.groupby(['Célula', nome], observed=True).size().reset_index(name='n')
+        contagem = contagem.sort_values('n', ascending=False).drop_duplicates('Célula')
+        agregado[nome] = contagem.set_index('Célula')[nome].reindex(agregado.index).astype(str)
+
+    return agregado.reset_index()
+
+
+# --- Índice espacial ---
+RAIO_TERRA_KM = 6371.0088
+KM_POR_GRAU = 2 * np.pi * RAIO_TERRA_KM / 360.0
+# Raio de incerteza (km) de cada código de 'Geo Precision'; sem código (censurado,
+# ausente) ou em nível de país, o ponto é tratado como de precisão desconhecida (inf)
+PRECISAO_GEO_KM = {2: 25.0, 3: 50.0, 4: 250.0, 5: 50.0}
+HOTSPOT_TAMANHO_KM = 25
+HOTSPOTS_POR_PAIS = 3
+
+
+def precisao_em_km(geo_precision):
+    """
+    Converte a coluna 'Geo Precision' (ex.: '(2) 25 km Precision ') no raio de incerteza em km.
+    """
+    codigos = pd.to_numeric(
+        geo_precision.astype('string').str.extract(r'^\s*\((\d+)\)', expand=False), errors='coerce'
+    )
+    return codigos.map(PRECISAO_GEO_KM).fillna(np.inf).to_numpy(dtype='float64')
+
+
+def distancia_haversine_km(lat, lon, lats, lons):
+    """
+    Distância (km) de grande círculo entre o ponto (lat, lon) e os arrays lats/lons.
+    """
+    lat, lon = np.radians(lat), np.radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class IndiceEspacial:
+    """
+    Índice espacial construído uma única vez sobre o DataFrame de load_data: uma
+    BallTree com distância haversine (raio e k vizinhos) e as latitudes ordenadas
+    (retângulos). As consultas aceitam a máscara do IndiceFiltros, para combinar com
+    os filtros de país/ano, e um limite de precisão que descarta pontos cuja
+    incerteza de localização ('Geo Precision') é maior que a escala da pergunta.
+    """
+
+    def __init__(self, df):
+        self.n_linhas = len(df)
+        self._origem = weakref.ref(df)
+        self.latitude = df['Latitude'].to_numpy(dtype='float64')
+        self.longitude = df['Longitude'].to_numpy(dtype='float64')
+        self.precisao_km = precisao_em_km(df['Geo Precision'])
+        self._arvore = BallTree(np.radians(np.column_stack([self.latitude, self.longitude])), metric='haversine')
+        self._ordem_lat = np.argsort(self.latitude, kind='stable')
+        self._lat_ordenada = self.latitude[self._ordem_lat]
+
+    def indexa(self, df):
+        """
+        Indica se o índice foi construído sobre este mesmo objeto df.
+        """
+        return self._origem() is df
+
+    def _elegiveis(self, mascara=None, precisao_max_km=None):
+        if precisao_max_km is not None:
+            precisos = self.precisao_km <= precisao_max_km
+            mascara = precisos if mascara is None else mascara & precisos
+        return mascara
+
+    def raio(self, lat, lon, raio_km, mascara=None, precisao_max_km=None):
+        """
+        Posições e distâncias (km) dos pontos a até raio_km de (lat, lon), do mais próximo ao mais distante.
+        """
+        posicoes, distancias = self._arvore.query_radius(
+            np.radians([[lat, lon]]), r=raio_km / RAIO_TERRA_KM, return_distance=True, sort_results=True
+        )
+        posicoes, distancias = posicoes[0], distancias[0] * RAIO_TERRA_KM
+        elegiveis = self._elegiveis(mascara, precisao_max_km)
+        if elegiveis is not None:
+            manter = elegiveis[posicoes]
+            posicoes, distancias = posicoes[manter], distancias[manter]
+        return posicoes, distancias
+
+    def retangulo(self, lat_min, lat_max, lon_min, lon_max, mascara=None, precisao_max_km=None):
+        """
+        Posições (ordenadas) dos pontos dentro do retângulo. Com lon_min > lon_max,
+        o retângulo cruza o antimeridiano.
+        """
+        inicio = np.searchsorted(self._lat_ordenada, lat_min, side='left')
+        fim = np.searchsorted(self._lat_ordenada, lat_max, side='right')
+        candidatos = self._ordem_lat[inicio:fim]
+        lon = self.longitude[candidatos]
+        if lon_min <= lon_max:
+            dentro = (lon >= lon_min) & (lon <= lon_max)
+        else:
+            dentro = (lon >= lon_min) | (lon <= lon_max)
+        posicoes = np.sort(candidatos[dentro])
+        elegiveis = self._elegiveis(mascara, precisao_max_km)
+        if elegiveis is not None:
+            posicoes = posicoes[elegiveis[posicoes]]
+        return posicoes
+
+    def vizinhos(self, lat, lon, k, mascara=None, precisao_max_km=None):
+        """
+        Posições e distâncias (km) dos k pontos elegíveis mais próximos de (lat, lon).
+        """
+        elegiveis = self._elegiveis(mascara, precisao_max_km)
+        n_elegiveis = self.n_linhas if elegiveis is None else int(elegiveis.sum())
+        k = min(int(k), n_elegiveis)
+        if k == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        if elegiveis is not None and k * self.n_linhas >= n_elegiveis ** 2:
+            # Seleção pequena: a árvore teria de visitar quase todos os elegíveis;
+            # a distância direta sobre eles é mais barata
+            posicoes = np.flatnonzero(elegiveis)
+            distancias = distancia_haversine_km(lat, lon, self.latitude[posicoes], self.longitude[posicoes])
+            ordem = np.argsort(distancias, kind='stable')[:k]
+            return posicoes[ordem], distancias[ordem]
+
+        # Consulta a árvore ampliando k até encontrar k pontos elegíveis
+        k_consulta = k
+        while True:
+            distancias, posicoes = self._arvore.query(np.radians([[lat, lon]]), k=k_consulta)
+            posicoes, distancias = posicoes[0], distancias[0] * RAIO_TERRA_KM
+            if elegiveis is not None:
+                manter = elegiveis[posicoes]
+                posicoes, distancias = posicoes[manter], distancias[manter]
+            if len(posicoes) >= k or k_consulta == self.n_linhas:
+                return posicoes[:k], distancias[:k]
+            k_consulta = min(k_consulta * 4, self.n_linhas)
+
+
+@st.cache_resource(max_entries=2)
+def _carregar_indice_espacial(versao):
+    registrar_cache(False)
+    return IndiceEspacial(_load_data(versao))
+
+
+@instrumentar("espacial.indice", cacheado=True)
+def carregar_indice_espacial():
+    """
+    Constrói (uma vez por processo e versão dos dados) o índice espacial sobre o dataset de load_data.
+    """
+    return _carregar_indice_espacial(versao_dados())
+
+
+def _indices_consulta(df, paises, intervalo_anos, meses):
+    """
+    Índice espacial e máscara dos filtros de país/ano/mês para as linhas de df.
+    """
+    indice = carregar_indice_espacial()
+    if not indice.indexa(df):
+        indice = IndiceEspacial(df)
+    filtros = carregar_indice_filtros()
+    if not filtros.indexa(df):
+        filtros = IndiceFiltros(df)
+    mascara = None
+    if paises is not None or intervalo_anos is not None or meses is not None:
+        mascara = filtros.mascara(paises, intervalo_anos, meses)
+    return indice, mascara
+
+
+@instrumentar("espacial.raio")
+def consultar_raio(df, lat, lon, raio_km, paises=None, intervalo_anos=None, meses=None, precisao_max_km=None):
+    """
+    Incidentes a até raio_km de (lat, lon) que passam pelos filtros, do mais próximo
+    ao mais distante, com a coluna 'Distância (km)'.
+    """
+    indice, mascara = _indices_consulta(df, paises, intervalo_anos, meses)
+    posicoes, distancias = indice.raio(lat, lon, raio_km, mascara, precisao_max_km)
+    resultado = df.take(posicoes)
+    resultado['Distância (km)'] = distancias
+    return resultado
+
+
+@instrumentar("espacial.vizinhos")
+def consultar_vizinhos(df, lat, lon, k, paises=None, intervalo_anos=None, meses=None, precisao_max_km=None):
+    """
+    Os k incidentes mais próximos de (lat, lon) que passam pelos filtros, com a coluna 'Distância (km)'.
+    """
+    indice, mascara = _indices_consulta(df, paises, intervalo_anos, meses)
+    posicoes, distancias = indice.vizinhos(lat, lon, k, mascara, precisao_max_km)
+    resultado = df.take(posicoes)
+    resultado['Distância (km)'] = distancias
+    return resultado
+
+
+@instrumentar("espacial.retangulo")
+def consultar_retangulo(df, lat_min, lat_max, lon_min, lon_max, paises=None, intervalo_anos=None, meses=None,
+                        precisao_max_km=None):
+    """
+    Incidentes dentro do retângulo lat/lon que passam pelos filtros.
+    """
+    indice, mascara = _indices_consulta(df, paises, intervalo_anos, meses)
+    return df.take(indice.retangulo(lat_min, lat_max, lon_min, lon_max, mascara, precisao_max_km))
+
+
+@instrumentar("espacial.hotspots")
+def detectar_hotspots(df, tamanho_km=HOTSPOT_TAMANHO_KM, n_por_pais=HOTSPOTS_POR_PAIS, precisao_max_km=None):
+    """
+    Hotspots: as células de ~tamanho_km × tamanho_km com mais incidentes em cada país.
+
+    A grade tem faixas de latitude de altura fixa e, em cada faixa, largura em
+    longitude corrigida por cos(latitude), para que as células tenham área
+    parecida em qualquer latitude. Pontos com incerteza de localização maior que
+    precisao_max_km (por padrão, o próprio tamanho da célula) ficam de fora:
+    pontos geocodificados no centróide de uma província ou país se empilham numa
+    única coordenada e criariam hotspots artificiais.
+
+    Devolve (hotspots, n_descartados), onde n_descartados é o número de incidentes
+    excluídos pela precisão.
+    """
+    if precisao_max_km is None:
+        precisao_max_km = tamanho_km
+    precisos = precisao_em_km(df['Geo Precision']) <= precisao_max_km
+    n_descartados = int((~precisos).sum())
+
+    base = df.loc[precisos, ['Country', 'Latitude', 'Longitude', 'Total Victims']]
+    lat = base['Latitude'].to_numpy(dtype='float64')
+    lon = base['Longitude'].to_numpy(dtype='float64')
+    altura = tamanho_km / KM_POR_GRAU
+    faixa = np.floor((lat + 90.0) / altura)
+    centro_faixa = np.radians((faixa + 0.5) * altura - 90.0)
+    largura = altura / np.maximum(np.cos(centro_faixa), 1e-3)
+    coluna = np.floor((lon + 180.0) / largura)
+
+    base = base.assign(
+        Faixa=faixa.astype(np.int64), Coluna=coluna.astype(np.int64),
+        **{'Total Victims': base['Total Victims'].astype('int64')}
+    )
+    hotspots = (
+        base.groupby(['Country', 'Faixa', 'Coluna'], observed=True)
+        .agg(
+            Incidentes=('Total Victims', 'size'), **{'Total Victims': ('Total Victims', 'sum')},
+            Latitude=('Latitude', 'mean'), Longitude=('Longitude', 'mean')
+        )
+        .reset_index()
+        .sort_values(['Incidentes', 'Total Victims'], ascending=False, kind='stable')
+    )
+    hotspots = hotspots.groupby('Country', observed=True).head(n_por_pais)
+    hotspots['Country'] = hotspots['Country'].astype(str)
+    return hotspots.drop(columns=['Faixa', 'Coluna']).reset_index(drop=True), n_descartados
+
+
+FEATURES_IMPACTO = [
+    'Pct_Killed', 'Pct_Injured', 'Pct_Kidnapped', 'Pct_Arrested', 'Pct_Sexual'
+]
+# Atributos categóricos do perfil misto (impacto nas vítimas + quem, com o quê, onde)
+FEATURES_CATEGORICAS_PERFIL = [
+    'Country', 'Reported Perpetrator', 'Weapon Carried/Used', 'Type of education facility'
+]
+# Estratégias de clustering disponíveis: chave -> descrição
+ESTRATEGIAS_CLUSTERING = {
+    "impacto_vitimas": "Impacto nas vítimas (KMeans)",
+    "perfil_misto": "Perfil misto: impacto + país, perpetrador, arma e instalação (KPrototypes)",
+}
+# KPrototypes: linhas da amostra de ajuste, inicializações (em paralelo) e iterações máximas
+KPROTOTYPES_AMOSTRA = int(os.environ.get("EDU_DANGER_KPROTOTYPES_SAMPLE", "1000"))
+KPROTOTYPES_N_INIT = int(os.environ.get("EDU_DANGER_KPROTOTYPES_N_INIT", "4"))
+KPROTOTYPES_MAX_ITER = 20
+# Peso de cada atributo categórico divergente, em unidades das features Pct_* padronizadas
+KPROTOTYPES_GAMMA = 0.5
+# Linhas por bloco na atribuição ao protótipo mais próximo (limita a matriz linhas × k × atributos)
+KPROTOTYPES_BLOCO_ATRIBUICAO = 65536
+# Número máximo de resultados de clustering mantidos em memória
+CLUSTER_CACHE_SIZE = int(os.environ.get("EDU_DANGER_CLUSTER_CACHE_SIZE", "32"))
+
+
+class CacheClustering:
+    """
+    Cache LRU de resultados de clustering (rótulos e centróides), indexado pela
+    impressão digital das linhas filtradas, pelo número de clusters e pelas features.
+    """
+
+    def __init__(self, tamanho_max=CLUSTER_CACHE_SIZE):
+        self.tamanho_max = tamanho_max
+        self.hits = 0
+        self.misses = 0
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                self.hits += 1
+                return self._itens[chave]
+            self.misses += 1
+            return None
+
+    def guardar(self, chave, resultado):
+        with self._lock:
+            self._itens[chave] = resultado
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho_max:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "hits": self.hits, "misses": self.misses,
+                "itens": len(self._itens), "tamanho_max": self.tamanho_max,
+            }
+
+
+@st.cache_resource
+def obter_cache_clustering():
+    """
+    Cache de clustering compartilhado por todas as sessões do processo, já com
+    o clustering da seleção padrão quando há artefatos pré-computados.
+    """
+    cache = CacheClustering()
+    artefatos = localizar_artefatos()
+    if artefatos is not None and "clustering_padrao" in artefatos[1]:
+        diretorio, manifesto = artefatos
+        info = manifesto["clustering_padrao"]
+        dados = np.load(os.path.join(diretorio, "clustering_padrao.npz"))
+        chave = (info["impressao"], info["n_clusters"], tuple(info["features"]))
+        cache.guardar(chave, {"labels": dados["labels"], "centroides": dados["centroides"]})
+    return cache
+
+
+@st.cache_resource
+def obter_cache_codificacoes():
+    """
+    Cache, compartilhado pelas sessões, dos códigos inteiros dos atributos
+    categóricos do perfil misto, indexado pela impressão digital das linhas.
+    """
+    return CacheClustering(tamanho_max=8)
+
+
+def impressao_digital(df, colunas):
+    """
+    Hash das linhas (índice e valores das colunas) de um DataFrame.
+    """
+    hashes = pd.util.hash_pandas_object(df[colunas], index=True).to_numpy()
+    return hashlib.sha256(hashes.tobytes()).hexdigest()
+
+
+def calcular_features_impacto(df):
+    """
+    Features relativas de impacto nas vítimas (em float: os contadores são
+    inteiros sem sinal compactos).
+    """
+    denominador = df['Total Victims'].astype('float64') + 1
+    return pd.DataFrame({
+        'Pct_Killed': df['Total Killed'] / denominador,
+        'Pct_Injured': df['Total Injured'] / denominador,
+        'Pct_Kidnapped': df['Total Kidnapped'] / denominador,
+        'Pct_Arrested': df['Total Arrested'] / denominador,
+        'Pct_Sexual': df['Sexual Violence Affecting School Age Children'] / denominador,
+    }, index=df.index)
+
+
+def chave_clustering(df_cluster, n_clusters, features):
+    """
+    Chave do CacheClustering: impressão digital das linhas/features, k e features.
+    """
+    return (impressao_digital(df_cluster, features), n_clusters, tuple(features))
+
+
+def ajustar_clustering(df_cluster, n_clusters, features):
+    """
+    Ajusta o pipeline StandardScaler + KMeans e devolve rótulos e centróides.
+    """
+    transformer = ColumnTransformer([
+        ('num', StandardScaler(), features),
+    ])
+
+    pipeline = Pipeline([
+        ('transform', transformer),
+        ('cluster', KMeans(n_clusters=n_clusters, random_state=42, n_init='auto'))
+    ])
+
+    cluster_labels = pipeline.fit_predict(df_cluster[features])
+    return {
+        "labels": cluster_labels,
+        "centroides": pipeline.named_steps['cluster'].cluster_centers_,
+    }
+
+
+def codificar_categoricas(df, colunas, impressao=None):
+    """
+    Matriz (linhas × colunas) de códigos inteiros dos atributos categóricos; valores
+    ausentes ficam com o código -1, tratado como uma categoria própria. Com a
+    impressão digital das linhas, a matriz é reaproveitada entre reruns e sessões.
+    """
+    cache = obter_cache_codificacoes() if impressao is not None else None
+    chave = (impressao, tuple(colunas))
+    codigos = cache.obter(chave) if cache is not None else None
+    if codigos is None:
+        codigos = np.column_stack([
+            df[c].astype('category').cat.codes.to_numpy(dtype='int32') for c in colunas
+        ])
+        if cache is not None:
+            cache.guardar(chave, codigos)
+    return codigos
+
+
+def atribuir_perfil_misto(X_num, codigos, centroides, modas, gamma=KPROTOTYPES_GAMMA,
+                          bloco=KPROTOTYPES_BLOCO_ATRIBUICAO):
+    """
+    Rótulo do protótipo mais próximo para cada linha, com o custo do KPrototypes:
+    distância euclidiana ao quadrado nas features numéricas + gamma × número de
+    atributos categóricos diferentes da moda do protótipo. Vetorizado em blocos.
+    """
+    labels = np.empty(len(X_num), dtype='int32')
+    for inicio in range(0, len(X_num), bloco):
+        fim = inicio + bloco
+        custo = ((X_num[inicio:fim, None, :] - centroides[None, :, :]) ** 2).sum(axis=2)
+        custo += gamma * (codigos[inicio:fim, None, :] != modas[None, :, :]).sum(axis=2)
+        labels[inicio:fim] = custo.argmin(axis=1)
+    return labels
+
+
+def ajustar_perfil_misto(df_cluster, n_clusters, impressao=None, amostra=KPROTOTYPES_AMOSTRA, seed=42):
+    """
+    Ajusta o KPrototypes (Pct_* padronizadas + atributos categóricos) em uma amostra
+    de até `amostra` linhas, com as inicializações executadas em paralelo, e atribui
+    todas as linhas ao protótipo mais próximo. Devolve rótulos, centróides e modas.
+    """
+    X_num = StandardScaler().fit_transform(df_cluster[FEATURES_IMPACTO].to_numpy(dtype='float64'))
+    codigos = codificar_categoricas(df_cluster, FEATURES_CATEGORICAS_PERFIL, impressao)
+
+    idx = np.arange(len(X_num))
+    if amostra is not None and len(idx) > amostra:
+        rng = np.random.default_rng(seed)
+        idx = np.sort(rng.choice(len(idx), size=amostra, replace=False))
+
+    n_num = X_num.shape[1]
+    X_ajuste = np.empty((len(idx), n_num + codigos.shape[1]), dtype=object)
+    X_ajuste[:, :n_num] = X_num[idx]
+    X_ajuste[:, n_num:] = codigos[idx]
+
+    modelo = KPrototypes(
+        n_clusters=n_clusters, init='Huang', n_init=KPROTOTYPES_N_INIT,
+        max_iter=KPROTOTYPES_MAX_ITER, gamma=KPROTOTYPES_GAMMA, random_state=seed,
+        n_jobs=min(KPROTOTYPES_N_INIT, os.cpu_count() or 1)
+    )
+    modelo.fit(X_ajuste, categorical=list(range(n_num, X_ajuste.shape[1])))
+
+    prototipos = modelo.cluster_centroids_
+    centroides = prototipos[:, :n_num].astype('float64')
+    modas = prototipos[:, n_num:].astype('int32')
+    return {
+        "labels": atribuir_perfil_misto(X_num, codigos, centroides, modas),
+        "centroides": centroides,
+        "modas": modas,
+    }
+
+
+@instrumentar("aplicar_clustering")
+def aplicar_clustering(df, n_clusters=4, usar_cache=True, estrategia="impacto_vitimas"):
+    if estrategia not in ESTRATEGIAS_CLUSTERING:
+        raise ValueError(f"Estratégia de clustering desconhecida: {estrategia}")
+
+    # Cópia rasa: as novas colunas não alteram o DataFrame recebido (que pode ser
+    # o dataset compartilhado) e as colunas existentes não são duplicadas
+    df_cluster = df.copy(deep=False)
+
+    # Novas features relativas
+    df_cluster[FEATURES_IMPACTO] = calcular_features_impacto(df_cluster)[FEATURES_IMPACTO]
+    features = FEATURES_IMPACTO
+    if estrategia == "perfil_misto":
+        features = FEATURES_IMPACTO + FEATURES_CATEGORICAS_PERFIL
+
+    cache = obter_cache_clustering() if usar_cache else None
+    chave = chave_clustering(df_cluster, n_clusters, features)
+    resultado = cache.obter(chave) if cache is not None else None
+    registrar_cache(resultado is not None)
+
+    if resultado is None:
+        if estrategia == "perfil_misto":
+            resultado = ajustar_perfil_misto(df_cluster, n_clusters, impressao=chave[0])
+        else:
+            resultado = ajustar_clustering(df_cluster, n_clusters, features)
+        if cache is not None:
+            cache.guardar(chave, resultado)
+
+    df_cluster['Cluster'] = resultado["labels"]
+
+    return df_cluster
+
+
+def perfil_categorico_clusters(df_cluster, colunas=FEATURES_CATEGORICAS_PERFIL):
+    """
+    Tamanho e valor mais frequente de cada atributo categórico por cluster.
+    """
+    grupos = df_cluster.groupby('Cluster', observed=True)
+    perfil = pd.DataFrame({'Incidentes': grupos.size()})
+    for col in colunas:
+        contagem = df_cluster.groupby(['Cluster', col], observed=True).size()
+        perfil[col] = contagem.groupby(level=0).idxmax().str[1]
+    return perfil.reset_index()
+
+
+# --- Alertas de picos mensais ---
+# Medidas monitoradas, meses da linha de base (anteriores ao mês avaliado) e mínimo de
+# meses observados para avaliar um mês
+ANOMALIA_MEDIDAS = ['Incidentes', 'Total Victims']
+ANOMALIA_JANELA = int(os.environ.get("EDU_DANGER_ANOMALIA_JANELA", "12"))
+ANOMALIA_MIN_MESES = 6
+# Z robusto a partir do qual um mês é um pico e valor mínimo do mês (evita alertas de 0 -> 1)
+ANOMALIA_LIMIAR_Z = 3.5
+ANOMALIA_VALOR_MINIMO = 3
+# Menor escala aceita para o desvio da linha de base (em unidades da medida): séries
+# quase sempre zeradas não transformam qualquer ocorrência em um pico
+ANOMALIA_ESCALA_MINIMA = 1.0
+
+
+def escores_robustos(mensal, janela=ANOMALIA_JANELA, min_meses=ANOMALIA_MIN_MESES):
+    """
+    Linha de base e z robusto de cada mês para uma matriz séries × meses, todas as
+    séries de uma vez. A linha de base é a mediana dos `janela` meses anteriores e a
+    escala é o MAD (ou o desvio absoluto médio, quando o MAD é zero), convertidos em
+    desvio-padrão equivalente. Meses com menos de `min_meses` anteriores ficam com NaN.
+    """
+    mensal = np.asarray(mensal, dtype='float64')
+    # Janela t: os meses t - janela, ..., t - 1 (NaN antes do início da série)
+    anteriores = np.pad(mensal, ((0, 0), (janela, 0)), constant_values=np.nan)[:, :-1]
+    janelas = sliding_window_view(anteriores, janela, axis=1)
+
+    with warnings.catch_warnings():
+        # Janelas sem nenhum mês observado (início da série) resultam em NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        base = np.nanmedian(janelas, axis=2)
+        desvios = np.abs(janelas - base[..., None])
+        mad = np.nanmedian(desvios, axis=2)
+        desvio_medio = np.nanmean(desvios, axis=2)
+
+    escala = np.where(mad > 0, mad / 0.6745, 1.2533 * desvio_medio)
+    escala = np.fmax(escala, ANOMALIA_ESCALA_MINIMA)
+    z = (mensal - base) / escala
+    z[np.count_nonzero(~np.isnan(janelas), axis=2) < min_meses] = np.nan
+    return base, z
+
+
+def detectar_anomalias(serie, medidas=ANOMALIA_MEDIDAS, limiar_z=ANOMALIA_LIMIAR_Z,
+                       valor_minimo=ANOMALIA_VALOR_MINIMO, janela=ANOMALIA_JANELA):
+    """
+    Picos país × mês: meses cujo z robusto em relação à própria linha de base do
+    país é de pelo menos `limiar_z`. As matrizes mensais de todas as medidas são
+    empilhadas e avaliadas em uma única operação. Devolve um DataFrame com país,
+    mês, medida, valor, linha de base e z, do mês mais recente para o mais antigo.
+    """
+    matriz = np.concatenate([serie.matriz_mensal(m) for m in medidas])
+    base, z = escores_robustos(matriz, janela)
+    with np.errstate(invalid='ignore'):
+        linha, coluna = np.nonzero((z >= limiar_z) & (matriz >= valor_minimo))
+
+    n_paises = len(serie.paises)
+    picos = pd.DataFrame({
+        'Country': np.array(serie.paises, dtype=object)[linha % n_paises],
+        'Mês': serie.meses[coluna].to_timestamp(),
+        'Medida': np.array(medidas, dtype=object)[linha // n_paises],
+        'Valor': matriz[linha, coluna],
+        'Linha de base': base[linha, coluna],
+        'Z robusto': z[linha, coluna],
+    })
+    return picos.sort_values(['Mês', 'Z robusto'], ascending=False, ignore_index=True)
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _carregar_anomalias(versao, nome_backend, limiar_z):
+    registrar_cache(False)
+    return detectar_anomalias(_carregar_serie_temporal(versao, nome_backend), limiar_z=limiar_z)
+
+
+@instrumentar("anomalias", cacheado=True)
+def carregar_anomalias(limiar_z=ANOMALIA_LIMIAR_Z):
+    """
+    Picos mensais de todos os países, calculados uma vez por versão dos dados,
+    backend e limiar a partir das matrizes do motor de séries temporais.
+    """
+    return _carregar_anomalias(versao_dados(), BACKEND_PADRAO, limiar_z)
+
+
+def posicionar_picos(df, picos):
+    """
+    Posição de cada pico no mapa: o centro dos incidentes com coordenadas daquele
+    país e mês nas linhas filtradas. Picos sem incidentes localizados ficam de fora.
+    """
+    com_coordenadas = df.dropna(subset=['Latitude', 'Longitude'])
+    centros = com_coordenadas.groupby(['Country', 'Year', 'Month'], observed=True)[['Latitude', 'Longitude']].mean()
+    centros.index = centros.index.set_levels(centros.index.levels[0].astype(str), level=0)
+    chave = pd.MultiIndex.from_arrays([
+        picos['Country'].astype(str), picos['Mês'].dt.year, picos['Mês'].dt.month
+    ])
+    posicoes = centros.reindex(chave).to_numpy()
+    return picos.assign(Latitude=posicoes[:, 0], Longitude=posicoes[:, 1]).dropna(subset=['Latitude', 'Longitude'])
+
+
+# Tamanho padrão da amostra usada no Silhouette Score e memória máxima por bloco de distâncias
+SILHOUETTE_SAMPLE_SIZE = 2000
+SILHOUETTE_WORKING_MEMORY_MB = 64
+
+
+@instrumentar("avaliar_clustering")
+def avaliar_clustering_detalhado(df, labels, features_usadas, amostra=SILHOUETTE_SAMPLE_SIZE,
+                                 seed=42, padronizar=False,
+                                 memoria_mb=SILHOUETTE_WORKING_MEMORY_MB):
+    """
+    Silhouette Score amostrado e com memória limitada.
+
+    Sorteia até `amostra` linhas com semente fixa (amostra=None usa todas), calcula
+    o silhouette de cada ponto em blocos de no máximo `memoria_mb` MB de distâncias
+    e devolve a média com um intervalo de confiança de 95%. Com padronizar=True as
+    features passam por um StandardScaler, reproduzindo o espaço em que o
+    aplicar_clustering agrupa os dados.
+    """
+    X = df[list(features_usadas)].to_numpy(dtype='float64')
+    y = np.asarray(labels)
+    if padronizar:
+        X = StandardScaler().fit_transform(X)
+
+    if amostra is not None and len(X) > amostra:
+        rng = np.random.default_rng(seed)
+        idx = np.sort(rng.choice(len(X), size=amostra, replace=False))
+        X, y = X[idx], y[idx]
+
+    with sklearn_config_context(working_memory=memoria_mb):
+        valores = silhouette_samples(X, y)
+    return _resumo_silhouette(valores)
+
+
+def _resumo_silhouette(valores):
+    """
+    Média dos silhouettes por ponto com intervalo de confiança de 95% (quantil t,
+    limitado ao intervalo válido [-1, 1]). Com menos de dois pontos não há
+    intervalo: ic_inferior e ic_superior valem None.
+    """
+    n = len(valores)
+    media = float(valores.mean())
+    if n < 2:
+        ic_inferior = ic_superior = None
+    else:
+        margem = float(stats.t.ppf(0.975, n - 1)) * float(valores.std(ddof=1)) / float(np.sqrt(n))
+        ic_inferior = max(media - margem, -1.0)
+        ic_superior = min(media + margem, 1.0)
+    return {
+        "score": media,
+        "ic_inferior": ic_inferior,
+        "ic_superior": ic_superior,
+        "n_amostra": n,
+    }
+
+
+@instrumentar("avaliar_clustering")
+def avaliar_perfil_misto(df_cluster, labels, amostra=SILHOUETTE_SAMPLE_SIZE, seed=42,
+                         memoria_mb=SILHOUETTE_WORKING_MEMORY_MB):
+    """
+    Silhouette Score do perfil misto na métrica do KPrototypes. Cada atributo
+    categórico vira um one-hot esparso com peso sqrt(gamma / 2): a distância
+    euclidiana ao quadrado nesse espaço é exatamente o custo do KPrototypes.
+    Amostragem e intervalo de confiança como em avaliar_clustering_detalhado.
+    """
+    X_num = StandardScaler().fit_transform(df_cluster[FEATURES_IMPACTO].to_numpy(dtype='float64'))
+    codigos = codificar_categoricas(df_cluster, FEATURES_CATEGORICAS_PERFIL)
+    y = np.asarray(labels)
+
+    if amostra is not None and len(y) > amostra:
+        rng = np.random.default_rng(seed)
+        idx = np.sort(rng.choice(len(y), size=amostra, replace=False))
+        X_num, codigos, y = X_num[idx], codigos[idx], y[idx]
+
+    linhas = np.arange(len(y))
+    peso = np.full(len(y), np.sqrt(KPROTOTYPES_GAMMA / 2))
+    blocos = [sparse.csr_matrix(X_num)]
+    for j in range(codigos.shape[1]):
+        _, categoria = np.unique(codigos[:, j], return_inverse=True)
+        blocos.append(sparse.csr_matrix((peso, (linhas, categoria))))
+    X = sparse.hstack(blocos, format='csr')
+
+    with sklearn_config_context(working_memory=memoria_mb):
+        valores = silhouette_samples(X, y)
+    return _resumo_silhouette(valores)
+
+
+@instrumentar("avaliar_clustering")
+def avaliar_clustering(df, labels, features_usadas, amostra=None, **kwargs):
+    """
+    Calcula o Silhouette Score com base nos dados e rótulos de cluster.
+    Com `amostra`, usa o modo amostrado de avaliar_clustering_detalhado.
+    """
+    try:
+        if amostra is not None:
+            resultado = avaliar_clustering_detalhado(df, labels, features_usadas, amostra=amostra, **kwargs)
+            return round(resultado["score"], 3)
+        score = silhouette_score(df[features_usadas], labels)
+        return round(score, 3)
+    except Exception as e:
+        return f"Erro ao calcular Silhouette Score: {e}"
+
+
+# Acima deste número de linhas a varredura de k usa MiniBatchKMeans por padrão
+KSWEEP_MINIBATCH_THRESHOLD = 50000
+
+
+# Matriz de features da varredura de k no processo do pool (recebida uma única vez, no initializer)
+_X_VARREDURA = None
+
+
+def _iniciar_processo_varredura(X):
+    global _X_VARREDURA
+    _X_VARREDURA = X
+
+
+def _ajustar_k(args, X=None):
+    """
+    Ajusta um único k da varredura (executado em um processo do pool, sobre a
+    matriz recebida no initializer, ou no processo atual com X explícito).
+    """
+    k, minibatch, amostra, seed = args
+    if X is None:
+        X = _X_VARREDURA
+    with threadpool_limits(limits=1):
+        if minibatch:
+            modelo = MiniBatchKMeans(n_clusters=k, random_state=seed, n_init='auto', batch_size=4096)
+        else:
+            modelo = KMeans(n_clusters=k, random_state=seed, n_init='auto')
+        labels = modelo.fit_predict(X)
+        try:
+            silhueta = avaliar_clustering_detalhado(
+                pd.DataFrame(X), labels, range(X.shape[1]), amostra=amostra, seed=seed
+            )["score"]
+        except ValueError:
+            # Todos os pontos da amostra em um único cluster
+            silhueta = float('nan')
+    return {"k": k, "inercia": float(modelo.inertia_), "silhouette": silhueta}
+
+
+def sugerir_k(curvas):
+    """
+    Sugere k pelo cotovelo da curva de inércia (ponto mais distante da reta
+    entre o primeiro e o último k, com os eixos normalizados). Com menos de três
+    valores de k, usa o maior Silhouette Score.
+    """
+    if len(curvas) < 3:
+        validas = curvas.dropna(subset=['silhouette'])
+        return int(validas.loc[validas['silhouette'].idxmax(), 'k']) if not validas.empty else None
+    k = curvas['k'].to_numpy(dtype='float64')
+    inercia = curvas['inercia'].to_numpy(dtype='float64')
+    k_norm = (k - k.min()) / (k.max() - k.min())
+    amplitude = inercia.max() - inercia.min()
+    inercia_norm = (inercia - inercia.min()) / amplitude if amplitude > 0 else np.zeros_like(inercia)
+    return int(k[np.argmax((1 - k_norm) - inercia_norm)])
+
+
+def _contexto_processos():
+    """
+    Contexto dos pools de processos: forkserver (ou spawn, onde não existe). O
+    servidor do Streamlit roda sessões em várias threads, e um fork herdaria
+    locks adquiridos por elas.
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    contexto = multiprocessing.get_context("forkserver")
+    # O servidor importa este módulo uma vez; os processos do pool nascem dele já prontos
+    contexto.set_forkserver_preload([__name__])
+    return contexto
+
+
+def varrer_k(df, k_min=2, k_max=50, minibatch=None, amostra=SILHOUETTE_SAMPLE_SIZE,
+             n_jobs=None, seed=42):
+    """
+    Varredura de k para o clustering por impacto nas vítimas.
+
+    Usa as mesmas features padronizadas do aplicar_clustering e ajusta todos os k
+    do intervalo em paralelo num pool de processos. Devolve um DataFrame com as
+    curvas de inércia (cotovelo) e de Silhouette Score amostrado por k.
+    minibatch=None ativa o MiniBatchKMeans acima de KSWEEP_MINIBATCH_THRESHOLD linhas.
+    """
+    X = StandardScaler().fit_transform(calcular_features_impacto(df)[FEATURES_IMPACTO])
+    if minibatch is None:
+        minibatch = len(X) > KSWEEP_MINIBATCH_THRESHOLD
+    ks = [k for k in range(k_min, k_max + 1) if k < len(X)]
+    tarefas = [(k, minibatch, amostra, seed) for k in ks]
+
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(tarefas))
+    if n_jobs <= 1:
+        resultados = [_ajustar_k(t, X) for t in tarefas]
+    else:
+        # X vai uma única vez para cada processo (initializer), não uma vez por k
+        with ProcessPoolExecutor(
+            max_workers=n_jobs, mp_context=_contexto_processos(),
+            initializer=_iniciar_processo_varredura, initargs=(X,)
+        ) as pool:
+            resultados = list(pool.map(_ajustar_k, tarefas))
+
+    return pd.DataFrame(resultados, columns=["k", "inercia", "silhouette"])
+
+
+@instrumentar("varredura_k", cacheado=True)
+@st.cache_data(max_entries=16, show_spinner="Ajustando os valores de k...")
+def varrer_k_cacheado(impressao, k_min, k_max, minibatch, amostra, _df):
+    """
+    varrer_k cacheado pela impressão digital das linhas filtradas (o DataFrame
+    em si não é hasheado pelo Streamlit).
+    """
+    registrar_cache(False)
+    return varrer_k(_df, k_min, k_max, minibatch=minibatch, amostra=amostra)
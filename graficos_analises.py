@@ -0,0 +1,98 @@
+# graficos_analises.py
+#
+# Dados + figuras de cada seção da página de Análises Detalhadas, a partir de uma
+# consulta já filtrada do backend (ConsultaCubo ou ConsultaDuckDB). Sem dependência
+# do Streamlit: a página cacheia e renderiza, e o benchmark mede as mesmas funções.
+
+import plotly.express as px
+
+PAISES_SUL_AMERICANOS = [
+    'Argentina', 'Bolivia', 'Brazil', 'Chile', 'Colombia', 'Ecuador',
+    'Guyana', 'Paraguay', 'Peru', 'Suriname', 'Uruguay', 'Venezuela'
+]
+VICTIM_COLS = [
+    'Educators Killed', 'Educators Injured', 'Educators Kidnapped',
+    'Students Killed', 'Students Injured', 'Students Kidnapped'
+]
+
+
+def secao_rankings(consulta):
+    if consulta.vazia:
+        return {"top_paises": None, "top_perpetradores": None}
+
+    country_counts = consulta.ranking('Country', 10).sort_values()
+    fig_paises = px.bar(country_counts, x=country_counts.values, y=country_counts.index, orientation='h', text_auto=True)
+    fig_paises.update_layout(yaxis_title=None, xaxis_title="Nº de Incidentes", showlegend=False)
+
+    perp_counts = consulta.ranking('Reported Perpetrator', 10).sort_values()
+    fig_perps = px.bar(perp_counts, x=perp_counts.values, y=perp_counts.index, orientation='h', text_auto=True)
+    fig_perps.update_layout(yaxis_title=None, xaxis_title="Nº de Incidentes", showlegend=False)
+    return {"top_paises": fig_paises, "top_perpetradores": fig_perps}
+
+
+def secao_tipos(consulta):
+    estatisticas_tipo = consulta.estatisticas_por_tipo()
+
+    incident_counts = estatisticas_tipo.set_index('Tipo')['Incidentes'].sort_values(ascending=False)
+    fig_types = px.bar(incident_counts, x=incident_counts.values, y=incident_counts.index, text_auto=True, orientation='h')
+    fig_types.update_layout(showlegend=False, yaxis_title=None, xaxis_title="Nº de Incidentes")
+
+    severity_df = estatisticas_tipo[['Tipo', 'Média de Vítimas']].dropna().sort_values('Média de Vítimas')
+    fig_severity = px.bar(severity_df, x='Média de Vítimas', y='Tipo', text_auto='.2f', orientation='h')
+    fig_severity.update_layout(yaxis_title=None, xaxis_title="Média de Vítimas por Incidente")
+    return {"tipos_de_incidente": fig_types, "severidade": fig_severity}
+
+
+def secao_custo_armamento(consulta):
+    human_cost = consulta.agregar(medidas=VICTIM_COLS)[VICTIM_COLS].sort_values(ascending=False)
+    fig_hc = px.bar(human_cost, x=human_cost.index, y=human_cost.values, text_auto=True)
+    fig_hc.update_layout(xaxis_title="Tipo de Vítima", yaxis_title="Contagem Total")
+
+    weapon_counts = consulta.ranking('Weapon Carried/Used', 10)
+    fig_weapons = px.pie(weapon_counts, names=weapon_counts.index, values=weapon_counts.values, hole=0.3)
+    fig_weapons.update_traces(textinfo='percent+label')
+    return {"custo_humano": fig_hc, "armamento": fig_weapons}
+
+
+def secao_pais_vs_perpetrador(consulta):
+    if consulta.vazia:
+        return {"pais_vs_perpetrador": None}
+
+    top_5_countries_list = consulta.ranking('Country', 5).index
+    country_perp_crosstab = (
+        consulta.restringir('Country', top_5_countries_list)
+        .agregar(['Country', 'Reported Perpetrator'], ['Incidentes'])['Incidentes']
+        .unstack(fill_value=0)
+    )
+    crosstab_norm = country_perp_crosstab.div(country_perp_crosstab.sum(axis=1), axis=0) * 100
+
+    fig_cross = px.bar(crosstab_norm, orientation='h', text_auto='.2f', title="Proporção de Perpetradores por País (%)")
+    fig_cross.update_layout(xaxis_title="Percentual de Incidentes (%)", yaxis_title="País", legend_title="Perpetrador")
+    return {"pais_vs_perpetrador": fig_cross}
+
+
+def secao_america_do_sul(consulta, paises_regiao=PAISES_SUL_AMERICANOS):
+    # Restringe a seleção da barra lateral aos países sul-americanos
+    contagem_america_sul = consulta.restringir('Country', paises_regiao).ranking('Country')
+    if contagem_america_sul.empty:
+        return {"america_do_sul": None}
+
+    fig_sa = px.bar(
+        contagem_america_sul,
+        x=contagem_america_sul.index,
+        y=contagem_america_sul.values,
+        text_auto=True,
+        title="Incidentes na América do Sul"
+    )
+    fig_sa.update_layout(xaxis_title="País", yaxis_title="Número de Incidentes")
+    return {"america_do_sul": fig_sa}
+
+
+# Seções na ordem da página: chave -> função (consulta filtrada -> {gráfico: figura ou None})
+SECOES = {
+    "rankings": secao_rankings,
+    "tipos": secao_tipos,
+    "custo_armamento": secao_custo_armamento,
+    "pais_vs_perpetrador": secao_pais_vs_perpetrador,
+    "america_do_sul": secao_america_do_sul,
+}
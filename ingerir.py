@@ -0,0 +1,22 @@
+# ingerir.py
+
+import argparse
+
+from data_loader import ingerir_incremento, versao_dados
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Ingere um incremento (xlsx ou CSV) no store incremental do dashboard."
+    )
+    parser.add_argument("arquivos", nargs="+", help="Arquivo(s) com os novos incidentes")
+    args = parser.parse_args()
+
+    for caminho in args.arquivos:
+        novas = ingerir_incremento(caminho)
+        print(f"{caminho}: {novas} linha(s) nova(s) ingerida(s)")
+    print(f"Versão atual dos dados: {versao_dados()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+# instrumentacao.py
+#
+# Instrumentação leve por rerun: tempo, linhas de entrada/saída, pico de memória
+# alocada (do processo) e acerto/falha de cache de cada etapa (carga, filtros, clustering, gráficos).
+# Desativada, cada etapa custa apenas a checagem de um atributo thread-local.
+
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+
+import pandas as pd
+import streamlit as st
+
+DIAGNOSTICO_PADRAO = os.environ.get("EDU_DANGER_DIAGNOSTICO") == "1"
+DIAGNOSTICO_LOG = os.environ.get(
+    "EDU_DANGER_DIAGNOSTICO_LOG",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "diagnostico.jsonl")
+)
+
+# Cada sessão do Streamlit executa o script em sua própria thread
+_estado = threading.local()
+_lock_log = threading.Lock()
+# tracemalloc é global ao processo: só é parado quando nenhuma sessão está medindo.
+# Reservas por sessão (sessão -> marca do rerun que reservou): um rerun interrompido
+# (fastReruns, st.stop, exceção) é liberado no próximo rerun da mesma sessão, mesmo
+# que rode em outra thread, e sessões encerradas são descartadas.
+_lock_tracemalloc = threading.Lock()
+_reservas = {}
+# O pico do tracemalloc também é do processo: só a etapa que detém este lock zera e
+# lê o pico. Quem não o obtém (outra sessão está medindo) não mede memória, em vez
+# de esperar ou de zerar o pico da outra medição.
+_lock_medicao = threading.Lock()
+
+
+class _RegistroNulo:
+    """
+    Registro usado com a instrumentação desativada: ignora tudo.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, nome, valor):
+        pass
+
+
+_REGISTRO_NULO = _RegistroNulo()
+
+
+class Registro:
+    """
+    Medição de uma etapa; usado como context manager.
+    """
+
+    def __init__(self, nome, linhas_entrada=None):
+        self.nome = nome
+        self.linhas_entrada = linhas_entrada
+        self.linhas_saida = None
+        self.cache = None
+        self.segundos = None
+        self.pico_mb = None
+        self.nivel = 0
+        self._medindo = False
+        self._dono_medicao = False
+
+    def __enter__(self):
+        pilha = _estado.pilha
+        self.nivel = len(pilha)
+        if tracemalloc.is_tracing():
+            if not _estado.medindo and _lock_medicao.acquire(blocking=False):
+                self._dono_medicao = _estado.medindo = True
+            self._medindo = _estado.medindo
+        if self._medindo:
+            atual, pico = tracemalloc.get_traced_memory()
+            if pilha and pilha[-1]._medindo:
+                pilha[-1]._pico_abs = max(pilha[-1]._pico_abs, pico)
+            tracemalloc.reset_peak()
+            self._mem_inicio = self._pico_abs = atual
+        pilha.append(self)
+        _estado.registros.append(self)
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.segundos = time.perf_counter() - self._inicio
+        pilha = _estado.pilha
+        pilha.pop()
+        if self._medindo:
+            _, pico = tracemalloc.get_traced_memory()
+            self._pico_abs = max(self._pico_abs, pico)
+            self.pico_mb = (self._pico_abs - self._mem_inicio) / 2**20
+            if pilha and pilha[-1]._medindo:
+                pilha[-1]._pico_abs = max(pilha[-1]._pico_abs, self._pico_abs)
+        if self._dono_medicao:
+            _estado.medindo = False
+            _lock_medicao.release()
+        return False
+
+    def como_dict(self):
+        return {
+            "etapa": self.nome,
+            "nivel": self.nivel,
+            "segundos": round(self.segundos, 6) if self.segundos is not None else None,
+            "linhas_entrada": self.linhas_entrada,
+            "linhas_saida": self.linhas_saida,
+            "pico_mb": round(self.pico_mb, 3) if self.pico_mb is not None else None,
+            "cache": self.cache,
+        }
+
+
+def ativo():
+    return getattr(_estado, "ativo", False)
+
+
+def etapa(nome, linhas_entrada=None):
+    """
+    Context manager que mede uma etapa do rerun atual:
+
+        with etapa("grafico.armamento") as r:
+            ...
+            r.linhas_saida = len(resultado)
+    """
+    if not getattr(_estado, "ativo", False):
+        return _REGISTRO_NULO
+    return Registro(nome, linhas_entrada)
+
+
+def registrar_cache(acerto):
+    """
+    Marca a etapa aberta mais interna como acerto (True) ou falha (False) de cache.
+    """
+    if getattr(_estado, "ativo", False) and _estado.pilha:
+        _estado.pilha[-1].cache = "hit" if acerto else "miss"
+
+
+def _tamanho(obj):
+    try:
+        return len(obj) if isinstance(obj, (pd.DataFrame, pd.Series)) else None
+    except TypeError:
+        return None
+
+
+def instrumentar(nome, cacheado=False):
+    """
+    Decorador: mede a função como uma etapa, registrando como linhas de entrada o
+    tamanho do primeiro argumento DataFrame e como saída o tamanho do retorno.
+    Com cacheado=True, a etapa conta como acerto de cache a menos que uma etapa
+    interna registre falha (registrar_cache(False)).
+    """
+    def decorador(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not getattr(_estado, "ativo", False):
+                return func(*args, **kwargs)
+            entrada = next((len(a) for a in args if isinstance(a, pd.DataFrame)), None)
+            with Registro(nome, entrada) as registro:
+                resultado = func(*args, **kwargs)
+                registro.linhas_saida = _tamanho(resultado)
+            if cacheado and registro.cache is None:
+                registro.cache = "hit"
+            return resultado
+        return wrapper
+    return decorador
+
+
+def _id_sessao():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+        return ctx.session_id if ctx else None
+    except Exception:
+        return None
+
+
+def _chave_sessao():
+    sessao = _id_sessao()
+    return ("sessao", sessao) if sessao else ("thread", threading.get_ident())
+
+
+def _parar_tracemalloc_ocioso():
+    # Chamado com _lock_tracemalloc adquirido
+    if not _reservas and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def _reservar_tracemalloc(chave):
+    marca = object()
+    with _lock_tracemalloc:
+        _reservas[chave] = marca
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+    return marca
+
+
+def _liberar_tracemalloc(chave, marca=None):
+    """
+    Libera a reserva da sessão; com `marca`, só se ela ainda pertence àquele rerun.
+    """
+    with _lock_tracemalloc:
+        if chave not in _reservas or (marca is not None and _reservas[chave] is not marca):
+            return
+        del _reservas[chave]
+        _parar_tracemalloc_ocioso()
+
+
+def _descartar_sessoes_encerradas():
+    """
+    Remove reservas de sessões desconectadas no meio de um rerun.
+    """
+    try:
+        from streamlit.runtime import Runtime
+        if not Runtime.exists():
+            return
+        runtime = Runtime.instance()
+    except Exception:
+        return
+    with _lock_tracemalloc:
+        for chave in [c for c in _reservas if c[0] == "sessao"]:
+            if not runtime.is_active_session(chave[1]):
+                del _reservas[chave]
+        _parar_tracemalloc_ocioso()
+
+
+def iniciar_rerun(pagina):
+    """
+    Chamado no início de cada página: mostra o controle de diagnóstico na barra
+    lateral e, se ativado, passa a coletar as etapas deste rerun.
+    """
+    # Rerun anterior desta sessão interrompido antes do finalizar_rerun
+    chave = _chave_sessao()
+    _liberar_tracemalloc(chave)
+    _descartar_sessoes_encerradas()
+
+    _estado.ativo = st.sidebar.toggle(
+        "Diagnóstico de desempenho", value=DIAGNOSTICO_PADRAO, key="diagnostico_ativo"
+    )
+    _estado.pagina = pagina
+    _estado.pilha = []
+    _estado.registros = []
+    _estado.medindo = False
+    if _estado.ativo:
+        _estado.inicio = time.perf_counter()
+        _estado.reserva = (chave, _reservar_tracemalloc(chave))
+
+
+def finalizar_rerun():
+    """
+    Chamado no fim de cada página: grava o rerun no log JSON e mostra o painel
+    de diagnóstico na barra lateral.
+    """
+    if not getattr(_estado, "ativo", False):
+        return
+    total = time.perf_counter() - _estado.inicio
+    _liberar_tracemalloc(*_estado.reserva)
+    _estado.ativo = False
+
+    etapas = [r.como_dict() for r in _estado.registros]
+    rerun = {
+        "id": uuid.uuid4().hex,
+        "sessao": _id_sessao(),
+        "pagina": _estado.pagina,
+        "registrado_em": datetime.now(timezone.utc).isoformat(),
+        "segundos_total": round(total, 6),
+        "etapas": etapas,
+    }
+    try:
+        os.makedirs(os.path.dirname(DIAGNOSTICO_LOG), exist_ok=True)
+        with _lock_log, open(DIAGNOSTICO_LOG, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(rerun, ensure_ascii=False) + "\n")
+    except OSError:
+        pass
+
+    with st.sidebar.expander("⏱️ Diagnóstico deste rerun", expanded=True):
+        st.caption(f"Tempo total do script: {total * 1000:.0f} ms")
+        st.caption(
+            "pico_mb é o pico de memória alocada do processo durante a etapa: inclui "
+            "alocações de outras sessões simultâneas e fica vazio quando outra sessão "
+            "já estava medindo memória."
+        )
+        if etapas:
+            tabela = pd.DataFrame(etapas)
+            tabela['etapa'] = ["  " * n + e for n, e in zip(tabela['nivel'], tabela['etapa'])]
+            tabela['ms'] = (tabela['segundos'] * 1000).round(1)
+            st.dataframe(
+                tabela[['etapa', 'ms', 'linhas_entrada', 'linhas_saida', 'pico_mb', 'cache']],
+                hide_index=True, use_container_width=True
+            )
@@ -1,13 +1,17 @@
 # pages/1_Análises_Detalhadas.py
 
+import hashlib
+
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-from data_loader import load_data # Importa a mesma função de carregamento
+import plotly.io as pio
+from instrumentacao import etapa, registrar_cache, iniciar_rerun, finalizar_rerun
+from data_loader import obter_backend, metadados_dataset, versao_dados
+from graficos_analises import SECOES # Gráficos respondidos por consultas agregadas do backend
 
 # --- Configuração da Página e Carregamento de Dados ---
 st.set_page_config(layout="wide", page_title="Análises | Educação em Perigo")
-df = load_data() # Usa a função cacheada
+iniciar_rerun("analises")
+backend = obter_backend() # pandas (cubo pré-agregado) ou duckdb (SQL sobre Parquet)
 
 # --- Título da Página ---
 st.title("📊 Análises Detalhadas")
@@ -15,125 +19,86 @@ st.markdown("Explore os dados de incidentes com visualizações detalhadas.")
 
 # --- Filtros (Aplicados a todos os gráficos desta página) ---
 st.sidebar.header("Filtros para Análises")
-paises_sorted = sorted(df['Country'].unique())
+paises_sorted = metadados_dataset()["paises"]
 selected_countries_details = st.sidebar.multiselect(
     "País(es) para Análise",
     options=paises_sorted,
     default=paises_sorted # Começa com todos selecionados
 )
-df_filtered = df[df['Country'].isin(selected_countries_details)]
-
-# --- GRÁFICOS MOVIDOS PARA CÁ ---
-st.markdown("### Rankings Principais")
-col_paises, col_perps = st.columns(2)
-
-with col_paises:
-    st.markdown("##### Top 10 Países por Incidentes")
-    if not df_filtered.empty:
-        country_counts = df_filtered['Country'].value_counts().head(10).sort_values()
-        fig = px.bar(country_counts, x=country_counts.values, y=country_counts.index, orientation='h', text_auto=True)
-        fig.update_layout(yaxis_title=None, xaxis_title="Nº de Incidentes", showlegend=False)
-        st.plotly_chart(fig, use_container_width=True)
-
-with col_perps:
-    st.markdown("##### Top 10 Perpetradores por Incidentes")
-    if not df_filtered.empty:
-        perp_counts = df_filtered['Reported Perpetrator'].value_counts().head(10).sort_values()
-        fig = px.bar(perp_counts, x=perp_counts.values, y=perp_counts.index, orientation='h', text_auto=True)
-        fig.update_layout(yaxis_title=None, xaxis_title="Nº de Incidentes", showlegend=False)
-        st.plotly_chart(fig, use_container_width=True)
-
-# --- Layout dos Gráficos ---
-
-# GRÁFICOS QUE FALTAVAM
-st.markdown("### Tipos de Incidentes e Severidade")
-col1, col2 = st.columns(2)
-
-with col1:
-    st.markdown("##### Contagem por Tipo de Incidente")
-    incident_type_cols = [
-        'Attacks on Schools', 'Attacks on Universities',
-        'Military Occupation of Education facility', 'Arson attack on education facility',
-        'Forced Entry into education facility', 'Damage/Destruction To Ed facility Event',
-        'Attacks on Students and Teachers'
-    ]
-    incident_counts = df_filtered[incident_type_cols].sum().sort_values(ascending=False)
-    fig_types = px.bar(incident_counts, x=incident_counts.values, y=incident_counts.index, text_auto=True, orientation='h')
-    fig_types.update_layout(showlegend=False, yaxis_title=None, xaxis_title="Nº de Incidentes")
-    st.plotly_chart(fig_types, use_container_width=True)
-
-with col2:
-    st.markdown("##### Severidade por Tipo de Ataque")
-    severity_by_type = {}
-    for col in incident_type_cols:
-        avg_victims = df_filtered[df_filtered[col] > 0]['Total Victims'].mean()
-        severity_by_type[col.replace(" facility", "").split(" ")[0]] = avg_victims
-    severity_df = pd.DataFrame(list(severity_by_type.items()), columns=['Tipo', 'Média de Vítimas']).sort_values('Média de Vítimas')
-    fig_severity = px.bar(severity_df, x='Média de Vítimas', y='Tipo', text_auto='.2f', orientation='h')
-    fig_severity.update_layout(yaxis_title=None, xaxis_title="Média de Vítimas por Incidente")
-    st.plotly_chart(fig_severity, use_container_width=True)
-
-st.markdown("---")
-st.markdown("### Custo Humano e Armamento Utilizado")
-col3, col4 = st.columns(2)
-
-with col3:
-    st.markdown("##### Custo Humano Total")
-    victim_cols = [
-        'Educators Killed', 'Educators Injured', 'Educators Kidnapped',
-        'Students Killed', 'Students Injured', 'Students Kidnapped'
-    ]
-    human_cost = df_filtered[victim_cols].sum().sort_values(ascending=False)
-    fig_hc = px.bar(human_cost, x=human_cost.index, y=human_cost.values, text_auto=True)
-    fig_hc.update_layout(xaxis_title="Tipo de Vítima", yaxis_title="Contagem Total")
-    st.plotly_chart(fig_hc, use_container_width=True)
-    
-with col4:
-    st.markdown("##### Armamento Utilizado (Top 10)")
-    weapon_counts = df_filtered['Weapon Carried/Used'].value_counts().head(10)
-    fig_weapons = px.pie(weapon_counts, names=weapon_counts.index, values=weapon_counts.values, hole=0.3)
-    fig_weapons.update_traces(textinfo='percent+label')
-    st.plotly_chart(fig_weapons, use_container_width=True)
 
-st.markdown("---")
-st.markdown("### Análise Cruzada: País vs. Perpetrador")
-st.markdown("Este gráfico mostra a proporção de tipos de perpetradores para os 5 países com mais incidentes (com base nos filtros atuais).")
 
-if not df_filtered.empty:
-    top_5_countries_list = df_filtered['Country'].value_counts().head(5).index
-    df_top5 = df_filtered[df_filtered['Country'].isin(top_5_countries_list)]
-    country_perp_crosstab = pd.crosstab(df_top5['Country'], df_top5['Reported Perpetrator'])
-    crosstab_norm = country_perp_crosstab.div(country_perp_crosstab.sum(axis=1), axis=0) * 100
-    
-    fig_cross = px.bar(crosstab_norm, orientation='h', text_auto='.2f', title="Proporção de Perpetradores por País (%)")
-    fig_cross.update_layout(xaxis_title="Percentual de Incidentes (%)", yaxis_title="País", legend_title="Perpetrador")
-    st.plotly_chart(fig_cross, use_container_width=True)
-
-st.markdown("---")
-st.markdown("### Análise Regional: América do Sul")
-st.markdown("Incidentes registrados nos países da América do Sul (com base nos filtros de país selecionados).")
-
-# Lista de países da América do Sul
-paises_sul_americanos = [
-    'Argentina', 'Bolivia', 'Brazil', 'Chile', 'Colombia', 'Ecuador',
-    'Guyana', 'Paraguay', 'Peru', 'Suriname', 'Uruguay', 'Venezuela'
-]
-
-# Filtra o DF já filtrado pela barra lateral para incluir apenas países sul-americanos
-df_america_sul = df_filtered[df_filtered['Country'].isin(paises_sul_americanos)]
-
-# Contar os incidentes por país
-contagem_america_sul = df_america_sul['Country'].value_counts()
+def impressao_selecao(paises):
+    """
+    Impressão digital da seleção de países (independe da ordem de escolha).
+    """
+    return hashlib.sha1("\x1f".join(sorted(paises)).encode('utf-8')).hexdigest()[:16]
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _figuras_secao(secao, impressao, versao, nome_backend, _paises):
+    """
+    Dados + figuras (JSON do Plotly) de uma seção, cacheados por seção, seleção de
+    países, versão dos dados e backend. _paises não entra na chave: a impressão o representa.
+    """
+    registrar_cache(False)
+    figuras = SECOES[secao](obter_backend(nome_backend).consulta(paises=_paises))
+    return {nome: fig.to_json() if fig is not None else None for nome, fig in figuras.items()}
+
+
+@st.fragment
+def renderizar_secao(chave, titulo, graficos, paises, expandida=False, descricao=None, aviso=None):
+    """
+    Seção recolhível que só é calculada quando está aberta. Abrir ou fechar a
+    seção reexecuta apenas este fragmento, não a página inteira.
+    """
+    secao = st.expander(titulo, expanded=expandida, key=f"secao_{chave}", on_change="rerun")
+    if not secao.open:
+        return
+
+    with secao, etapa(f"secao.{chave}"):
+        if descricao:
+            st.markdown(descricao)
+        figuras = _figuras_secao(chave, impressao_selecao(paises), versao_dados(), backend.nome, paises)
+        colunas = st.columns(len(graficos)) if len(graficos) > 1 else [st.container()]
+        for coluna, (nome, subtitulo) in zip(colunas, graficos):
+            with coluna:
+                if subtitulo:
+                    st.markdown(f"##### {subtitulo}")
+                if figuras[nome] is not None:
+                    st.plotly_chart(pio.from_json(figuras[nome]), use_container_width=True)
+                elif aviso:
+                    st.warning(aviso)
+
+
+# --- Seções da Página ---
+# As duas primeiras começam abertas; as demais só são calculadas quando o usuário as expande.
+renderizar_secao(
+    "rankings", "Rankings Principais",
+    [("top_paises", "Top 10 Países por Incidentes"), ("top_perpetradores", "Top 10 Perpetradores por Incidentes")],
+    selected_countries_details, expandida=True
+)
+renderizar_secao(
+    "tipos", "Tipos de Incidentes e Severidade",
+    [("tipos_de_incidente", "Contagem por Tipo de Incidente"), ("severidade", "Severidade por Tipo de Ataque")],
+    selected_countries_details, expandida=True
+)
+renderizar_secao(
+    "custo_armamento", "Custo Humano e Armamento Utilizado",
+    [("custo_humano", "Custo Humano Total"), ("armamento", "Armamento Utilizado (Top 10)")],
+    selected_countries_details
+)
+renderizar_secao(
+    "pais_vs_perpetrador", "Análise Cruzada: País vs. Perpetrador",
+    [("pais_vs_perpetrador", None)],
+    selected_countries_details,
+    descricao="Este gráfico mostra a proporção de tipos de perpetradores para os 5 países com mais incidentes (com base nos filtros atuais)."
+)
+renderizar_secao(
+    "america_do_sul", "Análise Regional: América do Sul",
+    [("america_do_sul", None)],
+    selected_countries_details,
+    descricao="Incidentes registrados nos países da América do Sul (com base nos filtros de país selecionados).",
+    aviso="Nenhum incidente registrado na América do Sul para os países selecionados no filtro."
+)
 
-if not contagem_america_sul.empty:
-    fig_sa = px.bar(
-        contagem_america_sul,
-        x=contagem_america_sul.index,
-        y=contagem_america_sul.values,
-        text_auto=True,
-        title="Incidentes na América do Sul"
-    )
-    fig_sa.update_layout(xaxis_title="País", yaxis_title="Número de Incidentes")
-    st.plotly_chart(fig_sa, use_container_width=True)
-else:
-    st.warning("Nenhum incidente registrado na América do Sul para os países selecionados no filtro.")
+finalizar_rerun()
@@ -0,0 +1,21 @@
+# precomputar.py
+
+import argparse
+
+from data_loader import precomputar_artefatos
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Pré-computa os artefatos servidos pelo dashboard (rodar antes do deploy). "
+                    "O diretório é o mesmo lido pelo app: EDU_DANGER_ARTIFACTS_DIR (padrão: artefatos/)."
+    )
+    parser.add_argument("--manter", type=int, default=3, help="Número de versões mantidas")
+    args = parser.parse_args()
+
+    diretorio = precomputar_artefatos(manter=args.manter)
+    print(f"Artefatos gerados em {diretorio}")
+
+
+if __name__ == "__main__":
+    main()